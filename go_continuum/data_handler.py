@@ -1,20 +1,18 @@
-"""Handle data for goco."""
-from typing import Optional, Tuple, List, Sequence
-from dataclasses import dataclass
+"""Handle data for goco.
+
+CASA and `goco_helpers` are imported by the functions that use them, so
+importing this module (e.g. to list the `goco` steps) does not load them.
+"""
+from typing import Any, Optional, Tuple, List, Sequence, Dict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field as dataclass_field
+from functools import lru_cache
+from glob import escape
+from hashlib import blake2b
 from pathlib import Path
 import json
+import shutil
 
-from casaplotms import plotms
-from goco_helpers.clean_tasks import (get_tclean_params, tclean_parallel,
-                                      pb_clean)
-from goco_helpers.config_generator import read_config
-from goco_helpers.continuum import get_continuum
-from goco_helpers.image_tools import pb_crop
-from goco_helpers.mstools import (flag_freqs_to_channels, spws_per_eb,
-                                  spws_for_names)
-import casatasks as tasks
-
-from go_continuum.afoli import afoli_iter_data
 from go_continuum.environment import GoCoEnviron
 
 CLEAN_DEFAULTS = {'deconvolver': 'hogbom',
@@ -23,6 +21,98 @@ CLEAN_DEFAULTS = {'deconvolver': 'hogbom',
                   'robust': 0.5,
                   'outframe': 'LSRK'}
 
+@lru_cache(maxsize=8)
+def _read_config_cached(configfile: str,
+                        mtime_ns: int,
+                        size: int) -> 'configparser.ConfigParser':
+    """Read a configuration file once per file version.
+
+    The modification time and size are only used as part of the cache key, so
+    a modified file is read again.
+    """
+    # pylint: disable=W0613
+    from goco_helpers.config_generator import read_config
+    return read_config(Path(configfile))
+
+def load_config(configfile: Path) -> 'configparser.ConfigParser':
+    """Load a configuration file reusing the parser if it has not changed.
+
+    Args:
+      configfile: Configuration file name.
+
+    Returns:
+      A configuration parser.
+    """
+    stat = configfile.stat()
+    return _read_config_cached(f'{configfile}', stat.st_mtime_ns, stat.st_size)
+
+@lru_cache(maxsize=32)
+def _spws_per_eb_cached(uvdata: str, mtime_ns: int) -> Dict[int, Tuple[int]]:
+    """Scan the spws per EB of `uvdata` once per MS version."""
+    # pylint: disable=W0613
+    from goco_helpers.mstools import spws_per_eb
+    return spws_per_eb(Path(uvdata))
+
+def get_spws_per_eb(uvdata: Path) -> Dict[int, Tuple[int]]:
+    """Spectral windows per EB, reusing the result if the MS is unchanged.
+
+    Args:
+      uvdata: Measurement set directory.
+
+    Returns:
+      A dictionary with the spws of each EB (starting from 1).
+    """
+    return _spws_per_eb_cached(f'{uvdata}', uvdata.stat().st_mtime_ns)
+
+def remove_path(path: Path) -> None:
+    """Delete a file or a directory tree (e.g. a MS) if it exists."""
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+def remove_paths(paths: Sequence[Path], max_workers: int = 8) -> None:
+    """Delete files and directory trees concurrently.
+
+    Deletion is I/O bound, so threads overlap the file system calls.
+
+    Args:
+      paths: Files or directories to delete.
+      max_workers: Optional; Maximum number of threads.
+    """
+    if len(paths) <= 1:
+        for path in paths:
+            remove_path(path)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(remove_path, paths))
+
+def image_products(imagename: Path) -> List[Path]:
+    """List all the products with the same stem as `imagename`.
+
+    E.g. for `image.spw0.image` it lists `image.spw0.*` (`.psf`, `.pb`, etc.).
+    """
+    return list(imagename.parent.glob(f'{escape(imagename.stem)}.*'))
+
+def write_json(filename: Path, value: Any) -> None:
+    """Write `value` to a JSON file only if its content changed.
+
+    The hash of the content is stored in a `.sha` file next to `filename`, so
+    the comparison does not need to read back and decode the JSON file.
+
+    Args:
+      filename: JSON file name.
+      value: Value to serialize.
+    """
+    payload = json.dumps(value, separators=(',', ':'))
+    digest = blake2b(payload.encode()).hexdigest()
+    hashfile = filename.with_name(f'{filename.name}.sha')
+    if (filename.is_file() and hashfile.is_file() and
+        hashfile.read_text() == digest):
+        return
+    filename.write_text(payload)
+    hashfile.write_text(digest)
+
 @dataclass
 class DataHandler:
     """Keep track of data used during goco."""
@@ -67,6 +157,8 @@ class DataHandler:
                            flags_list: List[List[Tuple]],
                            invert: bool = False) -> str:
         """Convert frequency flags to channels for stored uv data."""
+        from goco_helpers.mstools import flag_freqs_to_channels
+
         # Check
         if len(flags_list) != len(self.spws):
             raise ValueError(('Cannot map flags to spws: '
@@ -97,11 +189,17 @@ class DataManager:
     """Configuration parser."""
     flags: Optional[List[Tuple]] = None
     """Flagged frequency ranges for continuum."""
+    _concat_spw_strs: List[str] = dataclass_field(default_factory=list,
+                                                  init=False, repr=False)
+    """The `concat_spws` joined as `tclean` spw selections."""
+    _tclean_params: Dict[str, Dict[str, Any]] = dataclass_field(
+        default_factory=dict, init=False, repr=False)
+    """The `tclean` parameters per configuration section."""
 
     def __post_init__(self):
         if self.config is None:
             self.log.info('Reading config file: %s', self.configfile)
-            self.config = read_config(self.configfile)
+            self.config = load_config(Path(self.configfile))
 
         if self.data is None:
             self.log.info('Generating handlers')
@@ -110,6 +208,8 @@ class DataManager:
         if self.is_concat():
             self.log.info('Setting SPWs of concat data')
             self.set_concat_spws()
+        elif self.concat_spws is not None:
+            self._set_concat_spw_strs()
 
     @property
     def concat_uvdata(self):
@@ -129,17 +229,25 @@ class DataManager:
         original_uvdata = list(map(Path, original_uvdata.split(',')))
         self.log.info('Will generate handlers for uvdata: %s', original_uvdata)
 
+        # Values shared by all the handlers
+        name = self.config['DEFAULT']['name']
+        field = self.config['DEFAULT']['field']
+
+        # MS and spws of each EB
+        single_ms = len(original_uvdata) == 1 and neb != 1
+        if single_ms:
+            all_spws = get_spws_per_eb(original_uvdata[0])
+            layout = [(original_uvdata[0], all_spws[i+1]) for i in range(neb)]
+        else:
+            layout = [(original_uvdata[i],
+                       get_spws_per_eb(original_uvdata[i])[i+1])
+                      for i in range(neb)]
+
         # Generate the handlers
         handlers = []
-        for i in range(neb):
-            if neb != len(original_uvdata) and len(original_uvdata) == 1:
-                uvdata = original_uvdata[0]
-                spws = spws_per_eb(original_uvdata)[i+1]
-            else:
-                uvdata = original_uvdata[i]
-                spws = spws_per_eb(uvdata)[i+1]
-            handler = DataHandler(name=self.config['DEFAULT']['name'],
-                                  field=self.config['DEFAULT']['field'],
+        for i, (uvdata, spws) in enumerate(layout):
+            handler = DataHandler(name=name,
+                                  field=field,
                                   uvdata=uvdata,
                                   eb=i+1,
                                   spws=spws)
@@ -161,9 +269,51 @@ class DataManager:
         if len(self.data) == 1:
             self.concat_spws = [[i] for i in self.data[0].spws]
         else:
-            self.concat_spws = spws_for_names(self.concat_uvdata)
+            # Reuse the values stored for the current version of the MS
+            from goco_helpers.mstools import spws_for_names
+            cache = self.concat_uvdata.name + '.concat_spws.json'
+            cache = self.environ.uvdata / cache
+            mtime_ns = self.concat_uvdata.stat().st_mtime_ns
+            if cache.is_file():
+                cached = json.loads(cache.read_text())
+            else:
+                cached = {}
+            if cached.get('mtime_ns') == mtime_ns:
+                self.concat_spws = cached['spws']
+            else:
+                self.concat_spws = [list(map(int, spws))
+                                    for spws in spws_for_names(
+                                        self.concat_uvdata)]
+                cached = {'mtime_ns': mtime_ns, 'spws': self.concat_spws}
+                cache.write_text(json.dumps(cached, indent=4))
+        self._set_concat_spw_strs()
         self.log.info('Concat spws: %s', self.concat_spws)
 
+    def _set_concat_spw_strs(self) -> None:
+        """Join the `concat_spws` as `tclean` spw selections."""
+        self._concat_spw_strs = [','.join(map(str, spws))
+                                 for spws in self.concat_spws]
+
+    def _all_flags_str(self, invert: bool = False) -> str:
+        """Channel flags of all the EBs in CASA format."""
+        flags = (data.freq_flags_to_chan(self.flags, invert=invert)
+                 for data in self.data)
+        return ','.join(flags)
+
+    def _tclean(self, section: str) -> Dict[str, Any]:
+        """The `tclean` parameters in `section` merged with the defaults.
+
+        The section is read only once. The returned dictionary is shared, so
+        use it to build new dictionaries (e.g. with `|`) instead of updating
+        it.
+        """
+        if section not in self._tclean_params:
+            from goco_helpers.clean_tasks import get_tclean_params
+            self._tclean_params[section] = (
+                CLEAN_DEFAULTS | get_tclean_params(self.config[section]))
+
+        return self._tclean_params[section]
+
     def get_imagename(self,
                       intent: str,
                       fits: bool = False,
@@ -213,19 +363,20 @@ class DataManager:
         Return:
           A list with the image names.
         """
-        imagenames = []
-        for spw in range(self.nspws):
-            imagenames.append(self.get_imagename(intent, spw=spw,
-                                                 fits=fits))
+        base_dir = self.environ[intent]
+        stem = self.concat_uvdata.stem
+        extension = '.fits' if fits else ''
 
-        return imagenames
+        return [base_dir / f'{stem}.spw{spw}.image{extension}'
+                for spw in range(self.nspws)]
 
     def concat_data(self):
         """Concatenate data if more than 1 EB."""
         if len(self.data) > 1 and not self.is_concat():
+            import casatasks as tasks
             self.log.info('Concatenating input MSs')
-            vis = [f'{data.uvdata}' for data in self.data.values()]
-            tasks.concat(vis=vis, concatvis=f'{self.concat_uvdata}')
+            tasks.concat(vis=[f'{data.uvdata}' for data in self.data],
+                         concatvis=f'{self.concat_uvdata}')
             self.set_concat_spws()
 
     def clean_cube(self, intent: str, spw: int, nproc: int = 5,
@@ -244,14 +395,17 @@ class DataManager:
         # Check intent:
         if intent not in ['dirty', 'yclean', 'tclean']:
             raise NotImplementedError(f'Intent `{intent}` not recognized')
+        from goco_helpers.clean_tasks import tclean_parallel
+        from goco_helpers.image_tools import pb_crop
+        import casatasks as tasks
 
         # Get tclean parameters
-        tclean_pars = get_tclean_params(self.config[intent])
+        tclean_pars = self._tclean(intent) | {
+            'specmode': 'cube',
+            'spw': self._concat_spw_strs[spw],
+        }
         if intent == 'dirty':
-            tclean_pars.update({'niter': 0})
-        tclean_pars = CLEAN_DEFAULTS | tclean_pars
-        spw_str = ','.join(map(str, self.concat_spws[spw]))
-        tclean_pars.update({'specmode': 'cube', 'spw': spw_str})
+            tclean_pars['niter'] = 0
 
         # Run tclean
         imagename = self.get_imagename(intent, spw=spw)
@@ -292,6 +446,8 @@ class DataManager:
               image_intent: str = 'dirty',
               resume: bool = False) -> None:
         """Run AFOLI."""
+        from go_continuum.afoli import afoli_iter_data
+
         # Get target images
         images = self.get_imagenames(image_intent)
         if self.config.getboolean('afoli', 'use_crop', fallback=False):
@@ -301,11 +457,37 @@ class DataManager:
                                      log=self.log.info)
         self.flags = list(self.flags.values())
 
+    def _pb_clean_one(self,
+                      vis: Path,
+                      image: Path,
+                      tclean_pars: Dict[str, Any],
+                      existing: Sequence[str],
+                      nproc: int = 5,
+                      resume: bool = False) -> None:
+        """Run PB clean for `vis` unless `image` exists and `resume`.
+
+        Args:
+          vis: Measurement set.
+          image: Image file name.
+          tclean_pars: Parameters for `tclean`.
+          existing: Names of the files in the `image` directory.
+          nproc: Optional; Number of processes.
+          resume: Optional; Skip if the image exists?
+        """
+        if resume and image.name in existing:
+            self.log.info('Skipping continuum image: %s', image.name)
+            return
+        from goco_helpers.clean_tasks import pb_clean
+        pb_clean(vis, image.parent / image.stem, nproc=nproc,
+                 log=self.log.info, **tclean_pars)
+
     def get_continuum_vis(self,
                           pbclean: bool = False,
                           nproc: int = 5,
                           resume: bool = False) -> None:
         """Apply flags and calculate continuum."""
+        from goco_helpers.continuum import get_continuum
+
         # File products
         flags_file = self.concat_uvdata.with_suffix('.line_chan_flags.json')
         flags_file = self.environ.uvdata / flags_file.name
@@ -313,35 +495,38 @@ class DataManager:
         cont_avg = self.environ.uvdata / cont_avg.name
         cont_all = self.concat_uvdata.with_suffix('.cont_all.ms')
         cont_all = self.environ.uvdata / cont_all.name
+        existing = self.environ.listdir('uvdata')
+        image_all = self.get_imagename('continuum_control', uvdata=cont_all)
+        image_avg = self.get_imagename('continuum_control', uvdata=cont_avg)
+
+        # Delete previous products
+        if not resume:
+            stale = [vis for vis in (cont_all, cont_avg) if vis.name in existing]
+            if pbclean:
+                stale += image_products(image_all) + image_products(image_avg)
+            for path in stale:
+                self.log.warning('Deleting: %s', path)
+            remove_paths(stale)
 
         # Continuum: all channels
-        if cont_all.exists() and resume:
+        if cont_all.name in existing and resume:
             self.log.info('Skipping all channel continuum')
         else:
-            if cont_all.exists():
-                self.log.warning('Deleting all channel continuum MS')
-                os.system(f'rm -rf {cont_all}')
             self.log.info('Calculating all channels continum')
             get_continuum(self.concat_uvdata, cont_all,
                           config=self.config['continuum'],
                           plotdir=self.environ.plots, spw='0')
 
         # Continuum: flagged channels
-        if cont_avg.exists() and resume:
+        if cont_avg.name in existing and resume:
             self.log.info('Skipping line-free continuum')
         else:
             # Files
-            if cont_avg.exists():
-                self.log.warning('Deleting line-free continuum MS')
-                os.system(f'rm -rf {cont_avg}')
-            if flags_file.is_file() and resume:
+            if flags_file.name in existing and resume:
                 flags = json.loads(flags_file.read_text())
             else:
-                flags = []
-                for data in self.data:
-                    flags.append(data.freq_flags_to_chan(self.flags))
-                flags = ','.join(flags)
-                flags_file.write_text(json.dumps(flags, indent=4))
+                flags = self._all_flags_str()
+                write_json(flags_file, flags)
             
             # Get flagged continuum
             self.log.info('Calculating line-free continum')
@@ -354,61 +539,40 @@ class DataManager:
             self.log.info('*' * 15)
             self.log.info('PB clean:')
             self.log.info('*' * 15)
-            image_all = self.get_imagename('continuum_control', uvdata=cont_all)
-            image_avg = self.get_imagename('continuum_control', uvdata=cont_avg)
-            tclean_pars = get_tclean_params(self.config['continuum'])
-            tclean_pars = CLEAN_DEFAULTS | tclean_pars
-            tclean_pars['specmode'] = 'mfs'
-
-            # All channels
-            if resume and image_all.exists():
-                self.log.info('Skipping all channel continuum image')
-            else:
-                if image_all.exists():
-                    self.log.warning('Deleting all channel continuum image')
-                    os.system(f"rm -rf {image_all.with_suffix('.*')}")
-                imagename = image_all.parent / image_all.stem
-                pb_clean(cont_all, imagename, nproc=nproc, log=self.log.info,
-                         **tclean_pars)
-
-            # Avg channels
-            if image_avg.exists() and resume:
-                self.log.info('Skipping line-free continuum image')
-            else:
-                if image_avg.exists():
-                    self.log.warning('Deleting line free continuum image')
-                    os.system(f"rm -rf {image_avg.with_suffix('.*')}")
-                imagename = image_all.parent / image_avg.stem
-                pb_clean(cont_avg, imagename, nproc=nproc, log=self.log.info,
-                         **tclean_pars)
+            tclean_pars = self._tclean('continuum') | {'specmode': 'mfs'}
+            existing = self.environ.listdir('continuum_control')
+
+            # All channels and line-free images
+            for vis, image in ((cont_all, image_all), (cont_avg, image_avg)):
+                self._pb_clean_one(vis, image, tclean_pars, existing,
+                                   nproc=nproc, resume=resume)
 
         return cont_all, cont_avg
 
     def get_contsub_vis(self, resume: bool = False):
         """Calculate continuum subtracted visibilities."""
+        import casatasks as tasks
+
         # File products
         flags_file = self.concat_uvdata.with_suffix('.fitspec.json')
         flags_file = self.environ.uvdata / flags_file.name
         contsub_vis = self.concat_uvdata.with_suffix('.contsub.ms')
         contsub_vis = self.environ.uvdata / contsub_vis.name
+        existing = self.environ.listdir('uvdata')
 
         # Continuum: flagged channels
-        if contsub_vis.exists() and resume:
+        if contsub_vis.name in existing and resume:
             self.log.info('Skipping continuum subtraction')
         else:
             # Files
-            if contsub_vis.exists():
+            if contsub_vis.name in existing:
                 self.log.warning('Deleting contsub ms')
-                os.system(f'rm -rf {contsub_vis}')
-            if flags_file.is_file() and resume:
+                remove_path(contsub_vis)
+            if flags_file.name in existing and resume:
                 flags = json.loads(flags_file.read_text())
             else:
-                flags = []
-                for data in self.data:
-                    flags.append(data.freq_flags_to_chan(self.flags,
-                                                         invert=True))
-                flags = ','.join(flags)
-                flags_file.write_text(json.dumps(flags, indent=4))
+                flags = self._all_flags_str(invert=True)
+                write_json(flags_file, flags)
             
             # Get flagged continuum
             fitorder = self.config.getint('contsub', 'fitorder', fallback=1)
@@ -1,7 +1,8 @@
 """Data structures to manage information."""
-from typing import Optional
-from dataclasses import dataclass, asdict, InitVar
+from typing import FrozenSet, Optional, Tuple
+from dataclasses import dataclass, field, fields, InitVar
 from pathlib import Path
+import os
 
 @dataclass
 class GoCoEnviron():
@@ -20,6 +21,9 @@ class GoCoEnviron():
     """Directory for auto-selfcal."""
     plots: Optional[Path] = None
     """Directory for plots."""
+    _all_paths: Tuple[Path, ...] = field(default=(), init=False, repr=False,
+                                         compare=False)
+    """All the directories in the environment."""
     check_env: InitVar[bool] = False
     """Check that directories exist."""
 
@@ -36,24 +40,37 @@ class GoCoEnviron():
             self.auto_selfcal = self.basedir / 'auto_selfcal'
         if self.plots is None:
             self.plots = self.basedir / 'plots'
-            #self.plots.mkdir(exist_ok=True)
+        self._all_paths = (self.basedir, self.uvdata, self.dirty,
+                           self.continuum_control, self.cubes,
+                           self.auto_selfcal, self.plots)
         if check_env:
             self.do_check_env()
 
     def __getitem__(self, key):
-        #dict_form = {'dirty': self.dirty,
-        #             'continuum_control': self.continuum_control,
-        #             'cubes': self.cubes,
-        #             'auto_selfcal': self.auto_selfcal,
-        #             'plots': self.plots}
-        dict_form = asdict(self)
-        return dict_form[key]
+        if key not in _PATH_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
 
     def do_check_env(self):
         """Check that all directories exist."""
-        for path in asdict(self).values():
-            path.mkdir(exist_ok=True)
+        for path in self._all_paths:
+            os.makedirs(path, exist_ok=True)
+
+    def listdir(self, name: str) -> FrozenSet[str]:
+        """Names of the entries in directory `name`.
+
+        A single directory read replaces checking the existence of each file.
+        """
+        try:
+            with os.scandir(self[name]) as entries:
+                return frozenset(entry.name for entry in entries)
+        except FileNotFoundError:
+            return frozenset()
 
     def mkdir(self, name: str):
         """Make directory if needed."""
-        self[name].mkdir(exist_ok=True)
+        os.makedirs(self[name], exist_ok=True)
+
+# Path fields available with `GoCoEnviron[name]`
+_PATH_FIELDS = frozenset(fld.name for fld in fields(GoCoEnviron)
+                         if not fld.name.startswith('_'))
@@ -7,13 +7,16 @@ python goco.py -h
 ```
 """
 from typing import Optional, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 import argparse
 import os
 import sys
 
 from go_continuum.environment import GoCoEnviron
-from go_continuum.data_handler import DataManager
+from go_continuum.data_handler import (DataManager, image_products,
+                                       remove_paths)
 import goco_helpers.argparse_actions as actions
 import goco_helpers.argparse_parents as parents
 
@@ -43,17 +46,49 @@ def _goco_pipe(args: 'argparse.Namespace') -> None:
         args.log.info('Dirty images:')
         args.log.info('*' * 15)
         dirty_images = args.manager.get_imagenames('dirty', fits=False)
+        existing = args.manager.environ.listdir('dirty')
+        pending = []
+        stale = []
         for spw, image in enumerate(dirty_images):
-            args.log.info('-' * 15)
-            if args.resume and image.exists():
+            if args.resume and image.name in existing:
                 args.log.info('Skipping dirty for spw%i', spw)
                 continue
-            elif not args.resume and image.exists():
-                target = image.with_suffix('.*')
-                args.log.warning('Deleting dirty: %s', target)
-                os.system(f'rm -rf {target}')
-            args.log.info('Calculating dirty for spw%s', spw)
-            args.manager.clean_cube('dirty', spw, nproc=args.nproc[0])
+            elif not args.resume and image.name in existing:
+                args.log.warning('Deleting dirty: %s',
+                                 image.with_suffix('.*'))
+                stale += image_products(image)
+            pending.append(spw)
+        remove_paths(stale)
+
+        # Each spw is independent, but mpicasa runs (nproc > 1) are run one
+        # at a time
+        if args.nproc[0] > 1:
+            if args.njobs[0] > 1:
+                args.log.warning('Ignoring --njobs %i for mpicasa runs '
+                                 '(--nproc %i)', args.njobs[0], args.nproc[0])
+            njobs = 1
+        else:
+            njobs = min(args.njobs[0], len(pending), os.cpu_count() or 1)
+        if njobs > 1:
+            args.log.info('Calculating dirty for spws %s (%i jobs)', pending,
+                          njobs)
+            with ProcessPoolExecutor(
+                max_workers=njobs, mp_context=get_context('spawn')) as executor:
+                jobs = {}
+                for spw in pending:
+                    args.log.info('-' * 15)
+                    args.log.info('Calculating dirty for spw%s', spw)
+                    jobs[spw] = executor.submit(args.manager.clean_cube,
+                                                'dirty', spw,
+                                                nproc=args.nproc[0])
+                for spw, job in jobs.items():
+                    job.result()
+                    args.log.info('Dirty for spw%s finished', spw)
+        else:
+            for spw in pending:
+                args.log.info('-' * 15)
+                args.log.info('Calculating dirty for spw%s', spw)
+                args.manager.clean_cube('dirty', spw, nproc=args.nproc[0])
 
     # AFOLI
     if args.steps['afoli']:
@@ -116,6 +151,9 @@ def goco(args: Optional[Sequence] = None) -> None:
                         help='Base directory')
     parser.add_argument('-n', '--nproc', type=int, nargs=1, default=[5],
                         help='Number of processes for parallel steps')
+    parser.add_argument('-j', '--njobs', type=int, nargs=1, default=[1],
+                        help=('Number of spws imaged simultaneously, only '
+                              'used with --nproc 1'))
     parser.add_argument('--skip', nargs='+', choices=list(steps.keys()),
                         help='Skip these steps')
     parser.add_argument('--pos', metavar=('X', 'Y'), nargs=2, type=int,
@@ -135,7 +173,7 @@ def goco(args: Optional[Sequence] = None) -> None:
         args = sys.argv[1:]
     args = parser.parse_args(args)
     if args.list_steps:
-        args.log('Available steps: %s', list(steps.keys()))
+        args.log.info('Available steps: %s', list(steps.keys()))
         sys.exit(0)
     for step in pipe:
         step(args)
@@ -2,6 +2,7 @@
 from glob import glob
 from typing import List, Union
 import argparse
+import functools
 import os
 import pathlib
 
@@ -337,6 +338,23 @@ class ReadSkyCoords(argparse.Action):
         setattr(namespace, self.dest, vals)
 
 # Path actions
+@functools.lru_cache(maxsize=None)
+def _normalize_path(cwd: str, path: str) -> pathlib.Path:
+    """Expand user and variables in `path` and resolve it from `cwd`."""
+    path = os.path.expandvars(os.path.expanduser(path))
+    return pathlib.Path(os.path.realpath(os.path.join(cwd, path)))
+
+class NormalizePath(argparse.Action):
+    """Normalize a path or list of paths."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        cwd = os.getcwd()
+        if isinstance(values, str):
+            values = _normalize_path(cwd, values)
+        else:
+            values = [_normalize_path(cwd, val) for val in values]
+        setattr(namespace, self.dest, values)
+
 class MakePath(argparse.Action):
     """Check and create directory if needed."""
 
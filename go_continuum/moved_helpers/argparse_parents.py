@@ -4,8 +4,6 @@ import argparse
 import pathlib
 import warnings
 
-from casatasks import casalog
-
 #from .functions import positions_to_pixels
 from .argparse_actions import StartLogger, ReadQuantity, MakePath
 
@@ -45,6 +43,7 @@ def logger(filename: Optional['pathlib.Path'] = None,
     """
     parser = argparse.ArgumentParser(add_help=False)
     if use_casa:
+        from casatasks import casalog
         parser.add_argument('--logfile', default=None, nargs=1, type=str,
                             help='Log file name')
         parser.set_defaults(log=casalog)
@@ -5,10 +5,10 @@ from pathlib import Path
 import argparse
 import json
 import os
+import shutil
 import subprocess
 import sys
 
-from casatasks import exportfits, imsubimage, tclean
 #from casatools import image
 #import numpy as np
 
@@ -38,12 +38,14 @@ def tclean_parallel(vis: Path,
       log: optional; logging function.
     """
     if nproc == 1:
+        from casatasks import tclean
         tclean_args.update({'parallel': False})
         tclean(vis=str(vis), imagename=str(imagename), **tclean_args)
     else:
         # Save tclean params
         tclean_args.update({'parallel': True})
-        paramsfile = imagename.parent / 'tclean_params.json'
+        paramsfile = imagename.with_name(
+            f'{imagename.name}.tclean_params.json')
         paramsfile.write_text(json.dumps(tclean_args, indent=4))
 
         # Run
@@ -80,7 +82,9 @@ def compute_dirty(data: Sequence[DataHandler],
       An updated `DataHandler`.
     """
     # Check what is available
-    content = list(dirty_dir.glob('*.fits'))
+    with os.scandir(dirty_dir) as entries:
+        content = {Path(entry.path) for entry in entries
+                   if entry.name.endswith('.fits') and entry.is_file()}
     if len(data) == len(content) == 0:
         raise ValueError('Cannot run without any data')
     elif len(data) == 0:
@@ -91,23 +95,24 @@ def compute_dirty(data: Sequence[DataHandler],
         pass
 
     # Make the dirty images
+    from casatasks import exportfits, imsubimage
     tclean_pars = get_tclean_params(config)
     tclean_pars.update({'parallel': nproc > 1,
                         'niter': 0,
                         'specmode': 'cube'})
+    tclean_pars.pop('spw', None)
     for ebdata, spw, stem in iter_data(data):
         fitsfile = dirty_dir / f'{stem}.image.fits'
-        if fitsfile.is_file() and not redo:
+        if fitsfile in content and not redo:
             log(f'Skipping file {fitsfile}')
             continue
         tclean_pars['spw'] = spw
 
         # Clean data
         imagename = dirty_dir / stem
-        tclean_parallel(ebdata.uvdata, imagename, nproc, tclean_pars,
-                        log=log)
-        os.system((f'rm -r {imagename}'
-                   '{.model,.sumwt,.pb,.psf,.residual}'))
+        tclean_parallel(ebdata.uvdata, imagename, nproc, tclean_pars, log=log)
+        for suffix in ('.model', '.sumwt', '.pb', '.psf', '.residual'):
+            shutil.rmtree(f'{imagename}{suffix}', ignore_errors=True)
         imagename = dirty_dir / f'{stem}.image'
 
         # Crop data
@@ -120,7 +125,7 @@ def compute_dirty(data: Sequence[DataHandler],
             imsubimage(imagename=str(imagename),
                        outfile=str(crop_imagename),
                        box=box)
-            os.system(f'rm -r {imagename}')
+            shutil.rmtree(imagename, ignore_errors=True)
             imagename = crop_imagename
 
         # Export FITS
@@ -128,6 +133,6 @@ def compute_dirty(data: Sequence[DataHandler],
                    overwrite=redo)
 
         # Leave only FITS
-        os.system(f'rm -r {imagename}')
+        shutil.rmtree(imagename, ignore_errors=True)
 
     return data
@@ -1,38 +1,39 @@
 """Determine the continuum iteratively using AFOLI."""
 #!/bin/python3
-from typing import Any, Dict, Optional, TextIO, Sequence, List
-from configparser.ConfigParser import ConfigParser
+from typing import Any, Callable, Dict, Optional, TextIO, Sequence, List
+from configparser import ConfigParser
 import argparse
+import functools
+import os
 import sys
 
 import numpy as np
 import numpy.typing as npt
-import matplotlib.pyplot as plt
-import scipy.ndimage as ndi
-from astropy.stats import gaussian_fwhm_to_sigma
-from astropy.wcs import WCS
-from scipy.stats import linregress
-from scipy.interpolate import interp1d
-from scipy.optimize import bisect
-from astropy.stats import sigma_clip
 
 from go_continuum.utils import get_spectrum
 import go_continuum.argparse_actions as actions
 import go_continuum.argparse_parents as parents
 
+@functools.lru_cache(maxsize=16)
+def _load_config(path: str, mtime_ns: int, levelmode: str) -> ConfigParser:
+    """Read the configuration file, cached by path and modification time."""
+    cfg = ConfigParser(defaults={'flagchans':None,
+                                 'levels':None,
+                                 'levelmode':levelmode})
+    cfg.read(path)
+
+    return cfg
+
 def _prep(args: argparse.Namespace):
     """Initialize parameters for AFOLI."""
     # Initialize table
     if args.table is not None:
-        fmt = '%s\t' * len(args.tableinfo)
-        args.table.write(fmt % tuple(args.tableinfo))
+        args.table.write('\t'.join(args.tableinfo) + '\t')
 
     # Open configuration file
     if args.config is not None:
-        cfg = ConfigParser(defaults={'flagchans':None,
-                                     'levels':None,
-                                     'levelmode':args.levelmode})
-        cfg.read(args.config)
+        mtime_ns = os.stat(args.config).st_mtime_ns
+        cfg = _load_config(str(args.config), mtime_ns, args.levelmode)
         if cfg.has_section('afoli'):
             args.flagchans = cfg.get('afoli', 'flagchans')
             args.levels = cfg.get('afoli', 'levels')
@@ -52,14 +53,104 @@ def _prep(args: argparse.Namespace):
     if args.table is not None:
         args.table.write(f'{pix[0]:5}\t{pix[1]:5}\t')
 
+def _sigma_clip_kernel(spec: npt.ArrayLike,
+                       sigmas: npt.ArrayLike,
+                       use_median: bool,
+                       maxiters: int = 5) -> npt.ArrayLike:
+    """Iterate sigma clipping for each sigma level.
+
+    As in `astropy.stats.sigma_clip`, each level is iterated until
+    convergence or up to `maxiters` times.
+
+    Returns:
+      A boolean mask with the channels kept (i.e. continuum).
+    """
+    mask = np.isfinite(spec)
+    for nsigma in sigmas:
+        for _ in range(maxiters):
+            valid = spec[mask]
+            if valid.size == 0:
+                return mask
+            if use_median:
+                cen = np.median(valid)
+            else:
+                cen = np.mean(valid)
+            std = np.std(valid)
+            new = (np.abs(spec - cen) <= nsigma * std) & mask
+            if np.all(new == mask):
+                break
+            mask = new
+
+    return mask
+
+@functools.lru_cache(maxsize=None)
+def _compiled_kernel() -> Callable:
+    """Sigma clipping kernel, compiled with numba if it is available."""
+    try:
+        from numba import njit
+    except ImportError:
+        return _sigma_clip_kernel
+    return njit(cache=True)(_sigma_clip_kernel)
+
+def _sigma_clip_mask(spec: npt.ArrayLike,
+                     sigmas: npt.ArrayLike,
+                     use_median: bool,
+                     maxiters: int = 5) -> npt.ArrayLike:
+    """Run the sigma clipping kernel (see `_sigma_clip_kernel`)."""
+    return _compiled_kernel()(spec, sigmas, use_median, maxiters)
+
+def _linreg_clip_mask(spec: npt.ArrayLike,
+                      sigmas: npt.ArrayLike,
+                      maxiters: int = 5) -> npt.ArrayLike:
+    """Iterate sigma clipping of the residuals from a linear regression.
+
+    The centre is the regression value at the centre of the spw (see
+    `linreg_stat`), as in AFOLI with `censtat='linregress'`.
+
+    Returns:
+      A boolean mask with the channels kept (i.e. continuum).
+    """
+    from go_continuum.afoli import linreg_stat
+
+    mask = np.isfinite(spec)
+    for nsigma in sigmas:
+        for _ in range(maxiters):
+            if not np.any(mask):
+                return mask
+            resid = spec - linreg_stat(np.ma.array(spec, mask=~mask))
+            std = np.std(resid[mask])
+            new = (np.abs(resid) <= nsigma * std) & mask
+            if np.all(new == mask):
+                break
+            mask = new
+
+    return mask
+
+def func_sigmaclip(args: argparse.Namespace) -> npt.ArrayLike:
+    """Flag the channels rejected by iterative sigma clipping."""
+    spec = np.asarray(args.spectrum, dtype=float)
+    sigmas = np.asarray(args.sigma, dtype=float)
+    if args.censtat == 'linregress':
+        return ~_linreg_clip_mask(spec, sigmas)
+
+    return ~_sigma_clip_mask(spec, sigmas, args.censtat == 'median')
+
+def _mask_to_casa(mask: npt.ArrayLike, sep: str = ';') -> str:
+    """Convert the contiguous `True` runs of `mask` to CASA channels."""
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return ''
+    breaks = np.flatnonzero(np.diff(idx) != 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]]))
+
+    return sep.join(f'{start}' if start == end else f'{start}~{end}'
+                    for start, end in zip(starts, ends))
+
 def _postprocess(mask_flagged, args, filename=None):
-    # Group channels
+    # Group channels and convert to CASA format
     assert len(args.spectrum)==len(mask_flagged)
-    ind = np.arange(len(args.spectrum)) 
-    flagged = group_chans(ind[mask_flagged])
-
-    # Covert to CASA format
-    flagged = chans_to_casa(flagged)
+    flagged = _mask_to_casa(mask_flagged)
 
     if filename or args.chanfile:
         chanfile = filename or args.chanfile
@@ -190,7 +281,7 @@ def continuum_iterative(args):
         choices=['median', 'mean', 'linregress'],
         help="Statistic for sigma_clip cenfunc")
     psigmaclip.set_defaults(func=func_sigmaclip,
-                            func_params={'levelmode': 'nearest'}
+                            func_params={'levelmode': 'nearest'},
                             ref_spec=None)
     args = parser.parse_args(args)
     _prep(args)
@@ -1,17 +1,13 @@
+from typing import Callable, Optional, Sequence, Tuple
 import argparse
+import functools
+import os
 import sys
 
-from astropy.io import fits
-from astropy.stats import sigma_clip
 import astropy.units as u
-from astropy.wcs import WCS
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.ndimage.filters import maximum_filter
-from scipy.ndimage.morphology import binary_dilation
-from scipy.stats import linregress
+import numpy.typing as npt
 
-from myutils.argparse_actions import LoadFITS
 from myutils.logger import get_logger
 # Optional
 try:
@@ -22,12 +18,11 @@ except ImportError:
     LoadSourcefromConfig = None
 
 # Start settings
-if os.path.isdir('logs'):
-    logger = get_logger(__name__, file_name='logs/extract_spectra.log')
-else:
-    logger = get_logger(__name__, file_name='extract_spectra.log')
+os.makedirs('logs', exist_ok=True)
+logger = get_logger(__name__, file_name='logs/extract_spectra.log')
 
 def new_fits(data, hdr=None, filename=None):
+    from astropy.io import fits
 
     hdu = fits.PrimaryHDU(data, header=hdr)
     hdul = fits.HDUList([hdu])
@@ -36,6 +31,25 @@ def new_fits(data, hdr=None, filename=None):
 
     return hdul[0]
 
+@functools.lru_cache(maxsize=32)
+def _wcs2d(header_str: str):
+    """Build the 2-D WCS of a header, cached by the header text."""
+    from astropy.io import fits
+    from astropy.wcs import WCS
+
+    return WCS(fits.Header.fromstring(header_str), naxis=2)
+
+def write_spectrum(filename, spectrum):
+    """Write the spectrum with its channel number to a text file."""
+    spectrum = np.asarray(spectrum)
+    np.savetxt(filename,
+               np.column_stack((np.arange(spectrum.size), spectrum)),
+               fmt='%f %f')
+
+def read_spectrum(filename):
+    """Read a spectrum text file with one or more columns."""
+    return np.loadtxt(filename, dtype=float)
+
 def sum_collapse(cube: npt.ArrayLike,
                  rms: Optional[float] = None,
                  nsigma: float = 1.,
@@ -54,8 +68,8 @@ def sum_collapse(cube: npt.ArrayLike,
     """
     if rms is not None:
         log(f'Summing all values over: {nsigma * rms}')
-        masked = np.ma.masked_less(cube[edge:-edge, :, :], nsigma * rms)
-        imgsum = np.ma.sum(masked, axis=0)
+        view = cube[edge:-edge, :, :]
+        imgsum = np.where(view >= nsigma * rms, view, 0).sum(axis=0)
     else:
         log('Summing along spectral axis')
         imgsum = np.sum(cube[edge:-edge, :, :], axis=0)
@@ -66,7 +80,7 @@ def max_collapse(cube: npt.ArrayLike,
                  rms: Optional[float] = None,
                  nsigma: float = 1.,
                  edge: int = 10,
-                 log: Callable: print) -> npt.ArrayLike:
+                 log: Callable = print) -> npt.ArrayLike:
     """Collapse cube along the spectral axis using `max` function.
 
     If `rms` is given, then all values below `nsigma*rms` are set to zero.
@@ -83,16 +97,16 @@ def max_collapse(cube: npt.ArrayLike,
 
     # Replace values below rms
     if rms is not None:
-        log('Replacing values below %f by zero', nsigma * rms)
+        log(f'Replacing values below {nsigma * rms} by zero')
         imgmax[imgmax < rms] = 0.
 
     return imgmax
 
 def find_peak(image: Optional[npt.ArrayLike] = None,
-              cube: Optional[u.Quantity] = None,
-              rms: Optional[u.Quantity] = None,
+              cube: Optional[npt.ArrayLike] = None,
+              rms: Optional[float] = None,
               collapse_func: Callable = max_collapse,
-              diff: Optional[Sequence[npt.ArrayLike]] = None
+              diff: Optional[Sequence[npt.ArrayLike]] = None,
               log: Callable = print,
               **kwargs) -> Tuple[npt.ArrayLike, int, int]:
     """Find an emission peak.
@@ -105,7 +119,7 @@ def find_peak(image: Optional[npt.ArrayLike] = None,
     Args:
       image: 2-D image.
       cube: data cube.
-      rms: optional; cube noise level.
+      rms: optional; cube noise level in the same units as `cube`.
       collapse_func: optional; collapse function.
       diff: optional; differentials of the image along each axis.
       log: optional; logging function.
@@ -117,12 +131,16 @@ def find_peak(image: Optional[npt.ArrayLike] = None,
         collapsed = image
     elif cube is not None:
         log('Looking peak of collapsed cube')
-        collapsed = collapse_func(cube.value, rms=rms.to(cube.unit).value,
-                                  log=log, **kwargs)
+        collapsed = collapse_func(cube, rms=rms, log=log, **kwargs)
 
     # Find peak
     if diff is None:
-        ymax, xmax = np.unravel_index(np.nanargmax(collapsed), collapsed.shape)
+        flat = np.ravel(collapsed)
+        if np.isnan(flat).any():
+            ind = np.nanargmax(flat)
+        else:
+            ind = np.argmax(flat)
+        ymax, xmax = divmod(int(ind), collapsed.shape[1])
     else:
         # Search for peaks
         xmax = np.diff((diff[1] > 0).view(np.int8), axis=1)
@@ -132,37 +150,36 @@ def find_peak(image: Optional[npt.ArrayLike] = None,
         indxx = indxx + 1
         indyy = indyy + 1
 
-        # Select the one with the highest value
-        vals = collapsed[indxy, indxx]
-        ind = np.argsort(imgsum[indxy, indxx])[::-1]
-        indxy = indxy[ind]
-        indxx = indxx[ind]
-        for p in zip(indxx, indxy):
-            if p in zip(indyx, indyy):
-                if (rms is not None and
-                    collapsed[p[1], p[0]] <= rms.to(cube.unit).value):
-                    continue
-                xmax, ymax = p
-                break
+        # Select the common peak with the highest value
+        width = collapsed.shape[1]
+        common = np.intersect1d(indxy * width + indxx, indyy * width + indyx)
+        vals = collapsed.ravel()[common]
+        order = np.argsort(-vals)
+        common, vals = common[order], vals[order]
+        if rms is not None:
+            common = common[vals > rms]
+        if common.size == 0:
+            raise ValueError('Could not find a peak')
+        ymax, xmax = divmod(int(common[0]), width)
     
     return collapsed, xmax, ymax 
 
 def mask_image(img, x, y, r):
-    Y, X = np.indices(img.data.shape)
+    ny, nx = img.data.shape
+    Y, X = np.ogrid[:ny, :nx]
     pixsize = np.abs(img.header['CDELT1'])*3600.
-    dist = np.sqrt((x-X)**2 + (y-Y)**2)*pixsize
+    dist2 = ((x-X)**2 + (y-Y)**2)*pixsize**2
 
-    img.data[dist<=r] = 0. #np.nan
+    img.data[dist2<=r**2] = 0. #np.nan
 
     return img
 
 def get_diff(img):
-    newd = img.data*1.
-    newd[np.isnan(img.data)] = 0.
+    newd = np.where(np.isnan(img.data), 0., img.data)
     diffs = [np.diff(newd, axis=i) for i in range(2)]
     return diffs
 
-def load_data(filenames: Sequence['pathlib.Path']) -> :
+def load_data(filenames: Sequence['pathlib.Path']) -> None:
     # Get image
     if args.image is None:
         args.image, args.cubes = args.collapse(args.cube, rms=args.rms[0],
@@ -203,6 +220,8 @@ def get_spectrum(cube_file: Optional['pathlib.Path'] = None,
       A tuple with `(x,y)` coordinates of the spectrum position.
     """
     if cube_file is not None:
+        from astropy.io import fits
+
         # Check for collapsed image
         collapsed_file = cube_file.with_suffix('.collapsed.fits')
         if collapsed_file.is_file():
@@ -211,66 +230,70 @@ def get_spectrum(cube_file: Optional['pathlib.Path'] = None,
         else:
             collapsed = None
 
-        # Load cube
-        cube = fits.open(cube_file)[0]
-        header = cube.header
-        wcs = WCS(header, naxis=2)
-
-        # Remove dummy axes
-        cube = np.squeeze(cube.data) * u.Unit(header['BUNIT'])
-        log('Cube shape: %s', cube.shape)
+        # Load cube header, data are only read when needed
+        hdu = fits.open(cube_file, memmap=True, lazy_load_hdus=True)[0]
+        header = hdu.header
 
         # Find peak
         if position is not None:
             # User value
             xmax, ymax = position
             log(f'Using input reference position: {xmax} {ymax}')
+        if position is not None and not beam_avg:
+            # Read only the spectrum from disk
+            log('Using single pixel spectrum')
+            dummy = (0,) * (header['NAXIS'] - 3)
+            spectrum = hdu.section[dummy + (slice(None), ymax, xmax)]
         else:
-            # Peak value
-            collapsed, xmax, ymax = find_peak(image=collapsed, cube=cube,
-                                              rms=rms)
-            log(f'Using peak position: {xmax} {ymax}')
-
-            # Save collapsed image
+            # Remove dummy axes
+            cube = np.squeeze(hdu.data)
+            log(f'Cube shape: {cube.shape}')
+            if position is None:
+                # Peak value
+                if rms is not None:
+                    rms = rms.to(u.Unit(header['BUNIT'])).value
+                collapsed, xmax, ymax = find_peak(image=collapsed, cube=cube,
+                                                  rms=rms, log=log)
+                log(f'Using peak position: {xmax} {ymax}')
+
+                # Save collapsed image
 
         # Get spectrum at position
         if beam_avg:
+            from astropy.stats import gaussian_fwhm_to_sigma
+
             # Beam size
             log('Averaging over beam')
+            wcs = _wcs2d(header.tostring())
             pixsize = np.sqrt(wcs.proj_plane_pixel_area())
-            if args.beam_fwhm is not None:
-                beam_fwhm =gaussian_fwhm_to_sigma * args.beam_fwhm
-            else:
-                beam_fwhm = np.sqrt(header['BMIN'] * header['BMAJ'])
+            if beam_fwhm is None:
+                beam_fwhm = np.sqrt(header['BMIN'] * header['BMAJ']) * u.deg
             if beam_size is not None:
                 beam_sigma = beam_size
             else:
                 beam_sigma = gaussian_fwhm_to_sigma * beam_fwhm
-            beam_sigma = beam_sigma / pixsize.to(beam_sigma.unit)
-            args.log.info('Beam size (sigma) = %f pix', beam_sigma)
+            beam_sigma = (beam_sigma / pixsize).to_value(u.one)
+            log(f'Beam size (sigma) = {beam_sigma} pix')
 
             # Filter data
-            Y, X = np.indices(cube.shape[-2:])
-            dist = np.sqrt((X - xmax)**2. + (Y - ymax)**2.)
-            mask = dist > beam_sigma
-            masked = np.ma.array(cube.value,
-                                 mask=np.tile(mask, (cube.shape[0], 1)))
-            spectrum = np.ma.sum(masked, axis=(1, 2)) / np.sum(~mask)
-        else:
+            ny, nx = cube.shape[-2:]
+            Y, X = np.ogrid[:ny, :nx]
+            inside = (X - xmax)**2 + (Y - ymax)**2 <= beam_sigma**2
+            spectrum = (cube[:, inside].sum(axis=1) /
+                        np.count_nonzero(inside))
+        elif position is None:
             log('Using single pixel spectrum')
-            spectrum = cube[:, ymax, xmax].value
+            spectrum = cube[:, ymax, xmax]
         log(f'Number of channels: {spectrum.size}')
 
         # Save to file
         if spec_file is None:
             spec_file = cube_file.with_suffix(f'.x{xmax}_y{ymax}.spec.dat')
-        with spec_file.open('w') as out:
-            lines = ['%f %f' % fnu for fnu in enumerate(args.spectrum)]
-            out.write('\n'.join(lines))
+        write_spectrum(spec_file, spectrum)
 
     elif spec_file is not None and spec_file.is_file():
         # Load from file
-        spectrum = np.loadtxt(spec_file, dtype=float)
+        spectrum = read_spectrum(spec_file)
         log(f'Spectrum shape: {spectrum.shape}')
         if spectrum.ndim > 1:
             log('Selecting second column')
@@ -301,9 +324,7 @@ def extract_spectra(args):
                 specfile = args.specname[0] % j + '.p%ispec.dat' % i
             else:
                 specfile = args.specname[0] + '.p%ispec.dat' % i
-            with open(os.path.expanduser(specfile), 'w') as out:
-                out.write('\n'.join(['%f %f' % fnu for fnu in \
-                        enumerate(spec)]))
+            write_spectrum(os.path.expanduser(specfile), spec)
 
         # Write positions
         if args.pos_file[0]:
@@ -323,9 +344,7 @@ def extract_from_positions(args):
         # Save spectrum
         specfile = args.specname[0] + '.p%ispec.dat' % i
         logger.info('Writing spectrum file: %s', os.path.basename(specfile))
-        with open(os.path.expanduser(specfile), 'w') as out:
-            out.write('\n'.join(['%f %f' % fnu for fnu in \
-                    enumerate(spec)]))
+        write_spectrum(os.path.expanduser(specfile), spec)
 
 def extract_source_spec(args):
     # Iterate over data
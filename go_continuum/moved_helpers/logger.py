@@ -6,17 +6,46 @@ order to implement logging for the class.
 """
 from datetime import datetime
 from logging import handlers
+from functools import lru_cache
+from queue import SimpleQueue
 from typing import Optional, Union
+import atexit
 import logging
 import pathlib
 
+_LEVELS = {name: getattr(logging, name)
+           for name in ('DEBUG', 'INFO', 'WARNING', 'WARN', 'ERROR',
+                        'CRITICAL', 'FATAL', 'NOTSET')}
+
 def get_level(loglevel):
     """Convert to numeric logging level."""
-    numeric_level = getattr(logging, loglevel.upper(), None)
+    numeric_level = _LEVELS.get(loglevel.upper())
     if not isinstance(numeric_level, int):
         raise ValueError(f'Invalid log level: {loglevel}')
     return numeric_level
 
+_INFO_FMT = '%(levelname)s: %(message)s'
+
+class _InfoFormatter(logging.Formatter):
+    """Formatter specialized for the `INFO` standard output format."""
+
+    def __init__(self):
+        super().__init__(_INFO_FMT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if record.exc_info or record.exc_text or record.stack_info:
+            return super().format(record)
+        record.message = record.getMessage()
+        return f'{record.levelname}: {record.message}'
+
+@lru_cache(maxsize=8)
+def _formatter(fmt: str) -> logging.Formatter:
+    """Cached formatter for the given format."""
+    if fmt == _INFO_FMT:
+        return _InfoFormatter()
+    return logging.Formatter(fmt)
+
+@lru_cache(maxsize=8)
 def get_stdout_format(level: int = logging.INFO,
                       timestamp: bool = False) -> str:
     """Determines the stdout format.
@@ -32,7 +61,7 @@ def get_stdout_format(level: int = logging.INFO,
         else:
             fmt = '%(levelname)s ' + fmt
     elif level == logging.INFO:
-        fmt = '%(levelname)s: %(message)s'
+        fmt = _INFO_FMT
     else:
         raise NotImplementedError(f'fmt for level {level} not implemented')
 
@@ -52,21 +81,34 @@ def get_stdout_handler(level: int, timestamp: bool = False,
     sh.setLevel(level)
     if fmt is None:
         fmt = get_stdout_format(level=level, timestamp=timestamp)
-    sh.setFormatter(logging.Formatter(fmt))
+    sh.setFormatter(_formatter(fmt))
 
     return sh
 
 def get_file_handler(level: int, filename: Union[str, pathlib.Path],
                      timestamp: bool = False, max_bytes: int = 5242880,
                      backup_count: int = 5,
-                     fmt: Optional = None) -> handlers.RotatingFileHandler:
-    """Create a file logging handler.
+                     fmt: Optional = None,
+                     capacity: int = 512,
+                     background: bool = True) -> logging.Handler:
+    """Create a buffered file logging handler.
+
+    `DEBUG` records are buffered and written to a `RotatingFileHandler` as
+    soon as an `INFO` or higher record is logged, or when `capacity` records
+    are buffered. The buffer is flushed at exit by `logging.shutdown`.
+
+    If `background` is set, the returned `QueueHandler` only enqueues the
+    records, and the writing is done by a `QueueListener` thread that is
+    stopped at exit.
 
     Args:
       level: logging level.
       filename: logging file name
+      capacity: optional; number of records to buffer.
+      background: optional; write the records from a separate thread?
     """
-    filename = pathlib.Path(filename).expanduser().resolve()
+    # The handler makes the path absolute, no need to resolve it
+    filename = pathlib.Path(filename).expanduser()
     if timestamp:
         tstamp = '.' + datetime.now().isoformat(timespec='milliseconds')
         filename = filename.with_suffix(tstamp + filename.suffix)
@@ -76,9 +118,31 @@ def get_file_handler(level: int, filename: Union[str, pathlib.Path],
     fh = handlers.RotatingFileHandler(filename, maxBytes=max_bytes,
                                       backupCount=backup_count)
     fh.setLevel(level)
-    fh.setFormatter(logging.Formatter(fmt))
-
-    return fh
+    fh.setFormatter(_formatter(fmt))
+    mh = handlers.MemoryHandler(capacity, flushLevel=logging.INFO, target=fh)
+    mh.setLevel(level)
+    if not background:
+        return mh
+
+    # Write from a background thread
+    qh = handlers.QueueHandler(SimpleQueue())
+    qh.setLevel(level)
+    qh.listener = handlers.QueueListener(qh.queue, mh,
+                                         respect_handler_level=True)
+    qh.listener.start()
+    atexit.register(qh.listener.stop)
+
+    return qh
+
+def _set_file_level(handler: logging.Handler, level: int) -> None:
+    """Set the level of a file handler and of the handlers it wraps."""
+    handler.setLevel(level)
+    listener = getattr(handler, 'listener', None)
+    if isinstance(handler, handlers.QueueHandler) and listener is not None:
+        for inner in listener.handlers:
+            _set_file_level(inner, level)
+    elif isinstance(handler, handlers.MemoryHandler):
+        _set_file_level(handler.target, level)
 
 def _levels_from_verbose(verbose: str,
                          stdoutlevel: int = logging.INFO,
@@ -222,20 +286,19 @@ def update_logger(logger: logging.Logger,
     levels = _levels_from_verbose(verbose, stdoutlevel=stdoutlevel,
                                   filelevel=filelevel, timestamp=timestamp)
     # Loop through the handlers
+    stdout_fmt = _formatter(get_stdout_format(level=levels['stdout'],
+                                              timestamp=levels['timestamp']))
     nfilehandlers = 0
     for handler in logger.handlers:
-        if hasattr(handler, 'baseFilename'):
+        if isinstance(handler, (handlers.QueueHandler, handlers.MemoryHandler,
+                                logging.FileHandler)):
             # Update level
-            handler.setLevel(levels['file'])
+            _set_file_level(handler, levels['file'])
             nfilehandlers += 1
         else:
-            # Update level
+            # Update level and format
             handler.setLevel(levels['stdout'])
-
-            # Update format
-            fmt = get_stdout_format(level=levels['stdout'],
-                                    timestamp=levels['timestamp'])
-            handler.setFormatter(logging.Formatter(fmt))
+            handler.setFormatter(stdout_fmt)
 
     # Create file handler if needed
     if nfilehandlers == 0 and filename is not None:
@@ -261,29 +324,42 @@ class LoggedObject:
     """
     enabled = True
     _log = get_stdout_logger('LoggedObject')
+    _info, _debug = _log.info, _log.debug
+    _warn, _error = _log.warning, _log.error
 
     def __init__(self, name, **kwargs):
         """Initialize the object and apply options."""
         self._log = get_logger(name, **kwargs)
 
-    def _log_message(self, message: str,
+        # Bind the logging methods
+        self._info, self._debug = self._log.info, self._log.debug
+        self._warn, self._error = self._log.warning, self._log.error
+
+    def _log_message(self, message: str, *args,
                      log_level: int = logging.INFO) -> None:
-        """Log a message with the given level."""
-        if self.enabled:
-            self._log.log(log_level, message)
+        """Log a message with the given level.
 
-    def info(self, message: str) -> None:
+        The `message` is formatted with `args` only if the record is emitted.
+        """
+        if self.enabled and self._log.isEnabledFor(log_level):
+            self._log.log(log_level, message, *args)
+
+    def info(self, message: str, *args) -> None:
         """Log an `INFO` message."""
-        self._log_message(message, logging.INFO)
+        if self.enabled:
+            self._info(message, *args)
 
-    def debug(self, message: str) -> None:
+    def debug(self, message: str, *args) -> None:
         """Log a `DEBUG` message."""
-        self._log_message(message, logging.DEBUG)
+        if self.enabled:
+            self._debug(message, *args)
 
-    def warn(self, message: str) -> None:
-        """Log a `DEBUG` message."""
-        self._log_message(message, logging.WARN)
+    def warn(self, message: str, *args) -> None:
+        """Log a `WARNING` message."""
+        if self.enabled:
+            self._warn(message, *args)
 
-    def error(self, message: str) -> None:
-        """Log a `DEBUG` message."""
-        self._log_message(message, logging.ERROR)
+    def error(self, message: str, *args) -> None:
+        """Log an `ERROR` message."""
+        if self.enabled:
+            self._error(message, *args)
@@ -2,7 +2,11 @@
 from pathlib import Path
 import argparse
 import sys
-import json
+# Optional
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
 def main(args: list):
     """Run tclean."""
@@ -15,9 +19,8 @@ def main(args: list):
     args = parser.parse_args(args)
 
     # Load params
-    # pylint: disable=W1514
     paramsfile = Path(args.paramsfile[0])
-    tclean_params = json.loads(paramsfile.read_text())
+    tclean_params = loads(paramsfile.read_bytes())
 
     # Run tclean
     # pylint: disable=E0602
@@ -1,8 +1,12 @@
 """Execute yclean."""
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count, get_context
 from pathlib import Path
-from typing import Any, Callable, List, Optional, Sequence, TypeVar, Dict
+from typing import (Any, Callable, List, Optional, Sequence, TypeVar, Dict,
+                    Tuple)
 import argparse
+import shutil
 import sys
 import os
 
@@ -253,11 +257,52 @@ def crop_spectral_axis(img: image,
     aux = img.crop(outfile=str(outfile), axes=ind, chans=chans)
     aux.close()
 
+def _crop_one(job: Tuple[str, Path, Path]) -> str:
+    """Crop one cube along the spectral axis in its own image tool."""
+    chans, inp, outfile = job
+    img = image()
+    img.open(str(inp.expanduser()))
+    try:
+        crop_spectral_axis(img, chans, outfile)
+    finally:
+        img.close()
+
+    return str(outfile)
+
+def crop_cubes(inputs: Sequence[Path],
+               channels: Sequence[str],
+               prefix: str = 'temp') -> str:
+    """Crop cubes at specific channels in parallel.
+
+    Args:
+      inputs: input cubes to crop.
+      channels: channel ranges for spectral cropping.
+      prefix: optional; prefix of the cropped cube file names.
+
+    Returns:
+      A space separated list of the cropped cubes.
+    """
+    # Check
+    if len(channels) != len(inputs):
+        raise ValueError('Different length of input and channels')
+
+    # Crop images in parallel. Spawned processes do not inherit the casatools
+    # state nor the threads of the caller.
+    jobs = [(chans, inp, Path(f'{prefix}{i}.image'))
+            for i, (chans, inp) in enumerate(zip(channels, inputs))]
+    for *_, outfile in jobs:
+        shutil.rmtree(outfile, ignore_errors=True)
+    ctx = get_context('spawn')
+    with ctx.Pool(min(len(jobs), cpu_count())) as pool:
+        return ' '.join(pool.map(_crop_one, jobs))
+
 def join_cubes(inputs: Sequence[Path],
                output: Path,
                channels: Sequence[str],
                resume: bool = False,
-               log: Callable = print) -> None:
+               log: Callable = print,
+               filelist: Optional[str] = None,
+               prefix: Optional[str] = None) -> None:
     """Join cubes at specific channels.
 
     Args:
@@ -266,37 +311,29 @@ def join_cubes(inputs: Sequence[Path],
       channels: channel ranges for spectral cropping.
       resume: optional; resume calculations?
       log: optional; logging function.
+      filelist: optional; already cropped cubes (see `crop_cubes`).
+      prefix: optional; prefix of the cropped cube file names (default
+        derived from `output`).
     """
-    # Check
-    if len(channels) != len(inputs):
-        raise ValueError('Different length of input and channels')
-
     # Concatenated image
     imagename = output.expanduser()
+    if prefix is None:
+        prefix = f'{imagename}.temp'
 
     # Join
     if resume and imagename.is_dir():
         log(f'Skipping concatenated image: {imagename}')
     else:
         if imagename.is_dir():
-            os.system(f'rm -rf {imagename}')
+            shutil.rmtree(imagename)
         # Crop images
-        filelist = []
-        for i, (chans, inp) in enumerate(zip(channels, inputs)):
-            img = image()
-            img = img.open(str(inp.expanduser()))
-            img_name = Path(f'temp{i}.image')
-            if img_name.is_dir():
-                os.system('rm -rf temp*.image')
-            crop_spectral_axis(img, chans, img_name)
-            img.close()
-
-            # Store filenames
-            filelist.append(str(img_name))
-        filelist = ' '.join(filelist)
+        if filelist is None:
+            filelist = crop_cubes(inputs, channels, prefix=prefix)
 
         # Concatenate
-        img.imageconcat(outfile=str(imagename), infiles=filelist)
+        img = image()
+        aux = img.imageconcat(outfile=str(imagename), infiles=filelist)
+        aux.close()
         img.close()
 
     # Export fits
@@ -309,7 +346,9 @@ def join_cubes(inputs: Sequence[Path],
 
     # Clean up
     log('Cleaning up')
-    os.system('rm -rf temp*.image')
+    if filelist is not None:
+        for filename in filelist.split():
+            shutil.rmtree(filename, ignore_errors=True)
 
 def _run_yclean(args: NameSpace) -> None:
     """Run yclean."""
@@ -397,6 +436,7 @@ def _join_cubes(args: NameSpace) -> None:
 
     # Join the cubes
     directory = Path(args.basedir) / 'yclean'
+    joins = []
     for suff, val in args.finalcubes.items():
         # Output name
         if 'out_prefix' in args.config:
@@ -418,10 +458,26 @@ def _join_cubes(args: NameSpace) -> None:
             args.log.info(f'Copying cube: {val}')
             os.system(f'rsync -auvr {val[0]} {output}')
         else:
+            joins.append((f'{output.expanduser()}.temp', val, output))
+
+    # Crop the cubes of the next output while the current one is
+    # concatenated
+    channels = split_option(args.config, 'joinchans')
+    def _crop(join):
+        prefix, val, output = join
+        if args.resume and output.expanduser().is_dir():
+            return None
+        return crop_cubes(val, channels, prefix=prefix)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(_crop, joins[0]) if joins else None
+        for i, (prefix, val, output) in enumerate(joins):
+            filelist = future.result()
+            if i + 1 < len(joins):
+                future = pool.submit(_crop, joins[i + 1])
             args.log.info(f'Joining cubes: {val}')
-            join_cubes(val, output,
-                       split_option(args.config, 'joinchans'),
-                       resume=args.resume, log=args.log.info)
+            join_cubes(val, output, channels, resume=args.resume,
+                       log=args.log.info, filelist=filelist, prefix=prefix)
 
 def run_yclean(args: List) -> None:
     """Program main.
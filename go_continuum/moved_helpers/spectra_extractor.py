@@ -32,12 +32,24 @@ def new_fits(data, hdr=None, filename=None):
 
     return hdul[0]
 
+def write_spectrum(filename, spectrum):
+    """Write the spectrum with its channel number to a text file."""
+    spectrum = np.asarray(spectrum, dtype=np.float64)
+    np.savetxt(filename,
+               np.column_stack((np.arange(spectrum.size), spectrum)),
+               fmt='%f %f')
+
 def _sum_collapse(args: argparse.Namespace) -> None:
     """Call the function."""
     if rms is not None:
         logger.info('Summing all values over: %f', rms)
-        masked = np.ma.masked_less(cube.data[0,10:-10,:,:], rms)
-        imgsum = np.sum(masked, axis=0).data/cube.data.shape[1]
+        # Read the cube in blocks of channels
+        nchan = cube.shape[1]
+        imgsum = np.zeros(cube.shape[-2:])
+        for chan in range(10, nchan - 10, 64):
+            view = cube.section[0, chan:min(chan + 64, nchan - 10)]
+            imgsum += np.add.reduce(view, axis=0, where=view >= rms)
+        imgsum /= nchan
     else:
         logger.info('Summing along spectral axis')
         imgsum = func(cube.data[0,10:-10,:,:], axis=0)/cube.data.shape[1]
@@ -55,18 +67,20 @@ def _max_collapse(args: argparse.Namespace) -> None:
     """Call the function"""
     return max_collapse()
 
-def mask_image(img, x, y, r):
-    Y, X = np.indices(img.data.shape)
+def mask_image(img, x, y, r, grid=None):
+    if grid is None:
+        ny, nx = img.data.shape
+        grid = np.ogrid[:ny, :nx]
+    Y, X = grid
     pixsize = np.abs(img.header['CDELT1'])*3600.
-    dist = np.sqrt((x-X)**2 + (y-Y)**2)*pixsize
+    dist2 = (x-X)**2 + (y-Y)**2
 
-    img.data[dist<=r] = 0. #np.nan
+    img.data[dist2<=(r/pixsize)**2] = 0. #np.nan
 
     return img
 
 def get_diff(img):
-    newd = img.data*1.
-    newd[np.isnan(img.data)] = 0.
+    newd = np.where(np.isnan(img.data), 0., img.data)
     diffs = [np.diff(newd, axis=i) for i in range(2)]
     return diffs
 
@@ -82,6 +96,8 @@ def _prep(cube: 'pathlib.Path', args: argparse.Namespace):
     args.diff = get_diff(args.image)
 
 def extract_spectra(args):
+    spec_base = os.path.expanduser(args.specname[0])
+    positions = []
     for i in range(args.niter):
         logger.info('Iteration number: %i', i+1)
         if i==0:
@@ -91,41 +107,44 @@ def extract_spectra(args):
 
         for j, cube in enumerate(args.cubes):
             # Obtain spectrum
-            spec = cube.data[0,:,ymax,xmax]
+            spec = cube.section[0,:,ymax,xmax]
             
             # Save spectrum
             if len(args.cubes)>1:
-                specfile = args.specname[0] % j + '.p%ispec.dat' % i
+                specfile = spec_base % j + '.p%ispec.dat' % i
             else:
-                specfile = args.specname[0] + '.p%ispec.dat' % i
-            with open(os.path.expanduser(specfile), 'w') as out:
-                out.write('\n'.join(['%f %f' % fnu for fnu in \
-                        enumerate(spec)]))
-
-        # Write positions
-        if args.pos_file[0]:
-            with open(os.path.expanduser(args.pos_file[0]), 'a') as out:
-                out.write('%i %i\n' % (xmax, ymax))
+                specfile = spec_base + '.p%ispec.dat' % i
+            write_spectrum(specfile, spec)
+        positions.append((xmax, ymax))
         
         # Mask image
         if args.niter>1:
-            args.image = mask_image(args.image, xmax, ymax, args.radius[0])
+            if args.grid is None:
+                ny, nx = args.image.data.shape
+                args.grid = np.ogrid[:ny, :nx]
+            args.image = mask_image(args.image, xmax, ymax, args.radius[0],
+                                    grid=args.grid)
+
+    # Write positions
+    if args.pos_file[0]:
+        with open(os.path.expanduser(args.pos_file[0]), 'a') as out:
+            out.writelines('%i %i\n' % pos for pos in positions)
 
 def extract_from_positions(args):
+    spec_base = os.path.expanduser(args.specname[0])
     for i,(x,y) in enumerate(zip(args.locations[::2], args.locations[1::2])):
         # Obtain spectrum
         logger.info('Extracting spectra at: %i,%i', x, y)
-        spec = args.cube.data[0,:,y,x]
+        spec = args.cube.section[0,:,y,x]
 
         # Save spectrum
-        specfile = args.specname[0] + '.p%ispec.dat' % i
+        specfile = spec_base + '.p%ispec.dat' % i
         logger.info('Writing spectrum file: %s', os.path.basename(specfile))
-        with open(os.path.expanduser(specfile), 'w') as out:
-            out.write('\n'.join(['%f %f' % fnu for fnu in \
-                    enumerate(spec)]))
+        write_spectrum(specfile, spec)
 
 def extract_source_spec(args):
     # Iterate over data
+    chans_cache = {}
     for key in args.src.data.keys():
         # Spectrum
         if key not in args.keys and args.keys[0]!='all':
@@ -137,12 +156,12 @@ def extract_source_spec(args):
             spec = data.get_spectrum(coord=args.src.position)
 
         # Spectral axis
-        chans = np.squeeze(np.indices(spec.shape))
+        if spec.size not in chans_cache:
+            chans_cache[spec.size] = np.arange(spec.size)
+        chans = chans_cache[spec.size]
         freq = freq_axis(data.data)
-        comb = np.array(zip(chans,freq.value,spec.value),
-                dtype=[('chan',chans.dtype),
-                    ('freq',freq.value.dtype),
-                    ('flux',spec.value.dtype)])
+        comb = np.rec.fromarrays([chans, freq.value, spec.value],
+                names='chan,freq,flux')
         units = {'chan':u.Unit(''), 'freq':freq.unit, 'flux':spec.unit}
 
         # File name
@@ -182,7 +201,7 @@ def extract_spectra(args: List):
                         help='File name of image to look for peaks')
     parser.add_argument('--beam_avg', action='store_true', 
                         help='Compute a beam average spectrum')
-    parser.set_defaults(diff=None, cube=None)
+    parser.set_defaults(diff=None, cube=None, grid=None)
     # Subparsers
     subparsers = parser.add_subparsers()
     subparser_cube_parent = [verify_files('cubefiles',
@@ -3,6 +3,8 @@ from typing import (Optional, Sequence, List, TypeVar, Callable, Mapping, Any,
                     Tuple, Dict)
 from inspect import signature
 from collections import OrderedDict
+import functools
+import os
 
 import astropy.units as u
 import numpy.typling as npt
@@ -10,9 +12,16 @@ from casatasks import vishead
 
 from .common_types import SectionProxy
 
+@functools.lru_cache(maxsize=8)
+def _get_spws(vis: str, mtime_ns: int) -> List:
+    """Retrieve the spws names, cached by ms and modification time."""
+    return vishead(vis=vis, mode='get', hdkey='spw_name')[0]
+
 def get_spws(vis: 'pathlib.Path') -> List:
     """Retrieve the spws in a visibility ms."""
-    return vishead(vis=str(vis), mode='get', hdkey='spw_name')[0]
+    mtime_ns = os.stat(os.path.join(vis, 'SPECTRAL_WINDOW',
+                                    'table.dat')).st_mtime_ns
+    return list(_get_spws(str(vis), mtime_ns))
 
 def get_spws_indices(vis: 'pathlib.Path',
                      spws: Optional[Sequence[str]] = None,
@@ -31,27 +40,24 @@ def get_spws_indices(vis: 'pathlib.Path',
       A list with the spws in the vis ms.
     """
     # Spectral windows names
-    # Extract name by BB_XX and subwin SW_YY
-    names = [aux.split('#')[2]+'_'+aux.split('#')[3] for aux in get_spws(vis)]
-    name_set = set(names)
-
-    # Cases
-    if len(name_set) != len(names):
+    # Extract name by BB_XX and subwin SW_YY and group duplicates
+    spwinfo = OrderedDict()
+    duplicated = False
+    for i, aux in enumerate(get_spws(vis)):
+        parts = aux.split('#', 4)
+        key = f'{parts[2]}_{parts[3]}'
+        if key in spwinfo:
+            spwinfo[key] += f',{i}'
+            duplicated = True
+        else:
+            spwinfo[key] = f'{i}'
+    if duplicated:
         log('Data contains duplicated spectral windows')
-        spwinfo = OrderedDict()
-        for i, key in enumerate(names):
-            if key not in spwinfo:
-                spwinfo[key] = f'{i}'
-            else:
-                spwinfo[key] += f',{i}'
-    else:
-        spwinfo = OrderedDict(zip(names, map(str, range(len(names)))))
 
     # Spectral windows indices
-    if spws is not None:
-        spw_ind = list(map(int, spws))
-    else:
-        spw_ind = list(range(len(name_set)))
+    if spws is None:
+        return list(spwinfo.values())
+    spw_ind = set(map(int, spws))
 
     return [spw for i, spw in enumerate(spwinfo.values()) if i in spw_ind]
 
@@ -61,6 +67,11 @@ def iter_data(data: Sequence['data_handler.DataHandler']):
         for spw, stem in ebdata.spw_stems.items():
             yield ebdata, spw, stem
 
+@functools.lru_cache(maxsize=None)
+def _param_names(func: Callable) -> Tuple[str]:
+    """Cached names of the parameters of `func`."""
+    return tuple(signature(func).parameters)
+
 def get_func_params(func: Callable,
                     config: SectionProxy,
                     required_keys: Sequence[str] = (),
@@ -91,6 +102,12 @@ def get_func_params(func: Callable,
     # Default values
     if cfgvars is None:
         cfgvars = dict()
+    ignore_keys = frozenset(ignore_keys)
+    float_keys = frozenset(float_keys)
+    int_keys = frozenset(int_keys)
+    bool_keys = frozenset(bool_keys)
+    int_list_keys = frozenset(int_list_keys)
+    float_list_keys = frozenset(float_list_keys)
 
     # Check required arguments are in config
     for opt in required:
@@ -99,7 +116,7 @@ def get_func_params(func: Callable,
 
     # Filter paramters
     pars = {}
-    for key in signature(func).parameters:
+    for key in _param_names(func):
         if (key not in config and key not in cfgvars) or key in ignore_keys:
             continue
         #Check for type:
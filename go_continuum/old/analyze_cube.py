@@ -1,11 +1,13 @@
-import os, argparse
+from concurrent.futures import ThreadPoolExecutor
+import os, argparse, logging
 
 from astropy.stats import sigma_clip
 import numpy as np
 import matplotlib.pyplot as plt
+import scipy.ndimage as ndi
 
 from argparse_actions import LoadFITS
-from continuum_iterative import group_chans, chans_to_casa, find_continuum, plot_mask
+from continuum_iterative import group_chans, chans_to_casa, plot_mask
 from logger import get_logger
 
 logger = get_logger(__name__, filename='continuum_iterative.log')
@@ -30,6 +32,34 @@ def plot_results(spec, chans, plotname, continuum=None):
     plot_mask(ax, chans)
     fig.savefig(plotname, bbox='tight')
 
+def clip_spectra(spectra, sigma_lower=1.8, sigma_upper=1.8, edges=10,
+        min_width=2):
+    """Mask the lines of all the spectra (columns) in a 2-D array.
+
+    Vectorized version of `find_continuum` over the spectra in `spectra`,
+    with shape `(nchan, nspec)`.
+    """
+    # Mask invalid values and edges
+    spectra = np.ma.masked_invalid(spectra)
+    spectra.mask = np.ma.getmaskarray(spectra)
+    if edges > 0:
+        spectra.mask[:edges] = True
+        spectra.mask[-edges:] = True
+
+    # Filter data
+    mask = sigma_clip(spectra, sigma_lower=sigma_lower,
+            sigma_upper=sigma_upper, axis=0, masked=True).mask
+
+    # Unmask bands with width <= min_width along the spectral axis
+    if min_width > 0:
+        structure = [[0, 1, 0], [0, 1, 0], [0, 1, 0]]
+        labels, _ = ndi.label(mask, structure=structure)
+        small = np.bincount(labels.ravel()) <= min_width
+        small[0] = False
+        mask[small[labels]] = False
+
+    return mask
+
 def prep(args):
     logger.info('Preparing inputs')
     if args.rms:
@@ -47,7 +77,7 @@ def prep(args):
     args.cube.mask[-10:] = True
 
 def proc(cube, level, xsrc=None, ysrc=None, radius=None, min_width=2,
-        sigma_lower=1.8, sigma_upper=1.8, extremes=10):
+        sigma_lower=1.8, sigma_upper=1.8, extremes=10, nproc=1):
     # Max image
     assert len(cube.shape)==3
     maximg = np.ma.max(cube, axis=0)
@@ -58,40 +88,48 @@ def proc(cube, level, xsrc=None, ysrc=None, radius=None, min_width=2,
     # Central source mask
     if xsrc and ysrc and radius:
         logger.info('Central source position: %i, %i', xsrc, ysrc)
-        Y, X = np.indices(maximg.shape)
-        d = np.sqrt((X-xsrc)**2 + (Y-ysrc)**2)
+        Y, X = np.ogrid[:maximg.shape[0], :maximg.shape[1]]
+        d2 = (X-xsrc)**2 + (Y-ysrc)**2
         logger.info('Create mask for point outside source')
         logger.info('Source radius: %i pixels', radius)
-        mask_src = d > radius
+        mask_src = d2 > radius**2
     else:
         mask_src = None
     
-    # Iterate over unmasked spectra
-    logger.info('Iterating over spectra')
+    # Find continuum of the unmasked spectra by blocks of pixels
+    logger.info('Filtering spectra')
+    valid = ~np.ma.getmaskarray(maximg)
+    spectra = cube[:, valid]
+    positions = np.argwhere(valid)
+    def _clip(ind):
+        return ind, clip_spectra(spectra[:, ind], sigma_lower=sigma_lower,
+                sigma_upper=sigma_upper, edges=10, min_width=min_width)
+
+    # Combine
     total = np.zeros(cube.shape[0], dtype=bool)
     if mask_src is not None:
+        outside = mask_src[valid]
         surrounding = np.zeros(cube.shape[0], dtype=bool)
         central = np.zeros(cube.shape[0], dtype=bool)
     else:
         surrounding = None
         central = None
-    for i,j in zip(*np.where(~maximg.mask)):
-        # Spectrum
-        spec = cube[:,i,j]
-
-        # Find continuum
-        filspec, cont, cstd = find_continuum(spec, sigma_lower=sigma_lower, 
-                sigma_upper=sigma_upper, edges=10, erode=0, min_width=min_width, 
-                min_space=0, log=False)
-
-        # Combine
-        if np.all(filspec.mask):
-            logger.warn('Problem with pixel: %i, %i', j, i)
-        total = np.logical_or(total, filspec.mask)
-        if surrounding is not None and mask_src[i,j]:
-            surrounding = np.logical_or(surrounding, filspec.mask)
-        if central is not None and not mask_src[i,j]:
-            central = np.logical_or(central, filspec.mask)
+    blocks = np.array_split(np.arange(spectra.shape[1]), 4*nproc)
+    with ThreadPoolExecutor(max_workers=nproc) as pool:
+        for ind, mask in pool.map(_clip, blocks):
+            if logger.isEnabledFor(logging.WARNING):
+                for i, j in positions[ind][np.all(mask, axis=0)]:
+                    logger.warning('Problem with pixel: %i, %i', j, i)
+            np.bitwise_or(total, np.bitwise_or.reduce(mask, axis=1),
+                    out=total)
+            if mask_src is not None:
+                block_outside = outside[ind]
+                np.bitwise_or(surrounding,
+                        np.bitwise_or.reduce(mask[:, block_outside], axis=1),
+                        out=surrounding)
+                np.bitwise_or(central,
+                        np.bitwise_or.reduce(mask[:, ~block_outside], axis=1),
+                        out=central)
 
     # Info
     nfil = np.sum(total)
@@ -171,6 +209,8 @@ def main():
             help='Radius of the source in pixels')
     parser.add_argument('--min_width', nargs=1, type=int, default=[2],
             help='Minimum mask band width')
+    parser.add_argument('--nproc', nargs=1, type=int, default=[1],
+            help='Number of threads to filter the spectra')
     parser.add_argument('cube', action=LoadFITS, default=None,
             help='Data cube file name')
     parser.add_argument('filenames', default=None, nargs='*',
@@ -181,7 +221,7 @@ def main():
     totals = args.main(args.cube, args.level, xsrc=args.position[0],
             ysrc=args.position[1], radius=args.radius[0],
             sigma_lower=args.sigma[0], sigma_upper=args.sigma[1],
-            min_width=args.min_width[0])
+            min_width=args.min_width[0], nproc=args.nproc[0])
     args.post(totals[0], total2=totals[1], total3=totals[2], chanfiles=args.filenames,
             xsrc=args.position[0], ysrc=args.position[1],
             plotnames=args.plotnames, specname=args.specname, cube=args.cube)
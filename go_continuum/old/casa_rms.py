@@ -0,0 +1,96 @@
+"""Compute image rms and export images to FITS in CASA scripts."""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+try:
+    from astropy.io import fits
+except ImportError:
+    fits = None
+
+try:
+    from casatasks import exportfits
+    from casatools import image as iatool
+except ImportError:
+    from taskinit import iatool
+    from tasks import exportfits
+
+def image_shape(imagename):
+    """Read the image shape with the image tool."""
+    ia = iatool()
+    ia.open(imagename)
+    try:
+        shape = ia.shape()
+    finally:
+        ia.close()
+    return shape
+
+def get_box(imagename, size=50):
+    # Get image size
+    imshape = image_shape(imagename)
+
+    # Box
+    xtrc = imshape[0]/4
+    ytrc = imshape[0]/2
+    xblc = xtrc - size
+    ytrc = ytrc - size
+
+    return "%i,%i,%i,%i" % (xblc, ytrc, xtrc, ytrc)
+
+def stokes_i(data):
+    """Stokes I plane(s) of the FITS data."""
+    if data.ndim == 4:
+        data = data[0]
+    return data
+
+def box_rms(data, box):
+    """Compute the rms within `box` of the memory mapped FITS data."""
+    xblc, yblc, xtrc, ytrc = map(int, box.split(','))
+    sl = np.asarray(data[..., yblc:ytrc+1, xblc:xtrc+1], dtype=float)
+    return float(np.sqrt(np.nanmean(sl*sl)))
+
+def cube_rms(data, stride=4):
+    """Rms from the median absolute deviation of a strided view of the data.
+
+    Same definition as the `imstat` based rms: 1.4826 times the median
+    absolute deviation from the median.
+    """
+    arr = np.asarray(data[..., ::stride, ::stride], dtype=float)
+    mad = np.nanmedian(np.abs(arr - np.nanmedian(arr)))
+    return float(1.482602219*mad)
+
+def export_fits(imagename, fitsimage, box=None):
+    """Export to a temporary file in memory and copy it to `fitsimage`.
+
+    If `box` is given, the rms is computed from the FITS data (over the whole
+    cube if `box` is empty), stored in the FITS header and returned. If the
+    temporary export fails (e.g. not enough space in memory), the image is
+    exported directly to `fitsimage` and the rms is not computed.
+    """
+    imagename = str(imagename)
+    fitsimage = str(fitsimage)
+    tmpdir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    fd, tmpname = tempfile.mkstemp(suffix='.fits', dir=tmpdir)
+    os.close(fd)
+    rms = None
+    try:
+        exportfits(imagename=imagename, fitsimage=tmpname, overwrite=True)
+        if os.path.getsize(tmpname) == 0:
+            raise IOError('Could not export %s to %s' % (imagename, tmpname))
+        if box is not None and fits is not None:
+            with fits.open(tmpname, mode='update', memmap=True) as hdul:
+                data = stokes_i(hdul[0].data)
+                if box=='':
+                    rms = cube_rms(data)
+                else:
+                    rms = box_rms(data, box)
+                hdul[0].header['RMS'] = rms
+        shutil.copyfile(tmpname, fitsimage)
+    except (IOError, OSError, RuntimeError):
+        rms = None
+        exportfits(imagename=imagename, fitsimage=fitsimage, overwrite=True)
+    finally:
+        os.remove(tmpname)
+
+    return rms
@@ -35,10 +35,11 @@ def main():
     int_keys = ['niter', 'chanchunks']
     bool_keys = ['interactive', 'parallel', 'pbcor']
     ignore_keys = ['vis', 'imagename', 'spw']
+    sect_opts = frozenset(config.options(section))
+    keys = [key for key in tclean.parameters.keys()
+            if key in sect_opts and key not in ignore_keys]
     tclean_pars = {}
-    for key in tclean.parameters.keys():
-        if key not in config.options(section) or key in ignore_keys:
-            continue
+    for key in keys:
         #Check for type:
         if key in float_keys:
             tclean_pars[key] = config.getfloat(section, key)
@@ -67,9 +68,9 @@ def main():
         msname, ext = os.path.splitext(msname)
 
         # Cases:
-        if args.all_spws or 'spw' in config.options(section):
+        if args.all_spws or 'spw' in sect_opts:
             spw = ','.join(map(str,range(nspws)))
-            if 'spw' in config.options(section) and \
+            if 'spw' in sect_opts and \
                     config.get(section,'spw')!=spw:
                 spw = config.options(section)
                 imagename = '{0}/{1}.spw{2}.robust{3}'.format(args.outputdir[0],
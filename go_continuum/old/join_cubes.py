@@ -1,11 +1,20 @@
 #!casa -c
+from glob import glob
 import argparse
+import atexit
+import shutil
 
 # Local utils
 aux = os.path.dirname(sys.argv[2])
 sys.path.insert(0, aux)
 import casa_utils as utils
 
+def cleanup(pattern='temp*.image'):
+    print 'Cleaning up'
+    for filename in glob(pattern):
+        shutil.rmtree(filename, ignore_errors=True)
+
+
 def main():
     # Command line options
     parser = argparse.ArgumentParser()
@@ -26,9 +35,6 @@ def main():
     utils.join_cubes(args.inputs, args.output, args.channels, box=args.box)
 
 if __name__=="__main__":
-    try:
-        main()
-    finally:
-        print 'Cleaning up'
-        os.system('rm -rf temp*.image')
+    atexit.register(cleanup)
+    main()
     
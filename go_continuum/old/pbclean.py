@@ -1,25 +1,20 @@
-import os, argparse
+import os, sys, argparse
 from ConfigParser import ConfigParser
 
-def get_box(imagename, size=50):
-    # Get image size
-    imshape = imhead(imagename=imagename, mode='get', hdkey='shape')
+# Local utils
+aux = os.path.dirname(sys.argv[2])
+sys.path.insert(0, aux)
+import casa_rms
 
-    # Box
-    xtrc = imshape[0]/4
-    ytrc = imshape[0]/2
-    xblc = xtrc - size
-    ytrc = ytrc - size
-
-    return "%i,%i,%i,%i" % (xblc, ytrc, xtrc, ytrc)
-
-def put_rms(imagename, box=""):
+def put_rms(imagename, box="", rms=None):
     # Get rms
-    stats = imstat(imagename=imagename, box=box, stokes='I')
+    if rms is None:
+        stats = imstat(imagename=imagename, box=box, stokes='I')
+        rms = stats['rms'][0]
 
     # Put in header
     imhead(imagename=imagename, mode='put', hdkey='rms',
-            hdvalue=stats['rms'][0])
+            hdvalue=rms)
 
 def main():
     # Command line options
@@ -32,6 +27,8 @@ def main():
             help='Number of rms level')
     parser.add_argument('--nothreshold', action='store_true',
             help='Number of rms level')
+    parser.add_argument('--noredo', action='store_true',
+            help='Do not redo if files exists')
     parser.add_argument('--continuum', action='store_true',
             help='Clean continuum image')
     parser.add_argument('--spw', nargs=1, type=str,
@@ -64,60 +61,46 @@ def main():
         dirty = os.path.join(args.dirtydir[0], dirty)
         rms = imhead(imagename=dirty, mode='get', hdkey='rms')
         threshold = '%fmJy' % (args.nrms[0]*rms*1.E3,)
-    robust = config.getfloat('pbclean', 'robust')
+    params = dict(vis=args.uvdata[0],
+            imagename=args.imagename[0],
+            field = field,
+            outframe = 'LSRK',
+            imsize = imsize,
+            cell = cellsize,
+            deconvolver = 'hogbom',
+            niter = 10000,
+            weighting = 'briggs', 
+            robust = config.getfloat('pbclean', 'robust'), 
+            usemask = 'pb',
+            pbmask = config.getfloat('pbclean', 'pbmask'), 
+            gridder = 'standard', 
+            pbcor = True,
+            threshold=threshold,
+            interactive = False,
+            chanchunks=-1,
+            parallel=True)
+    if args.continuum:
+        params.update(spw=config.get('pbclean','spws'), specmode='mfs')
+    else:
+        params.update(spw=spw[0], specmode='cube')
     
     # Clean
-    if args.continuum:
-        tclean(vis=args.uvdata[0],
-                imagename=args.imagename[0],
-                field = field,
-                spw = config.get('pbclean','spws'),
-                outframe = 'LSRK',
-                specmode = 'mfs',
-                imsize = imsize,
-                cell = cellsize,
-                deconvolver = 'hogbom',
-                niter = 10000,
-                weighting = 'briggs', 
-                robust = robust, 
-                usemask = 'pb',
-                pbmask = config.getfloat('pbclean', 'pbmask'), 
-                gridder = 'standard', 
-                pbcor = True,
-                threshold=threshold,
-                interactive = False,
-                chanchunks=-1,
-                parallel=True)
+    done = os.path.isfile(os.path.join(args.imagename[0] + '.image',
+        'table.dat'))
+    if args.noredo and done:
+        casalog.post('Skipping tclean')
     else:
-        tclean(vis=args.uvdata[0],
-                imagename=args.imagename[0],
-                field = field,
-                spw = spw[0],
-                outframe = 'LSRK',
-                specmode = 'cube',
-                imsize = imsize,
-                cell = cellsize,
-                deconvolver = 'hogbom',
-                niter = 10000,
-                weighting = 'briggs', 
-                robust = robust, 
-                usemask = 'pb',
-                pbmask = config.getfloat('pbclean', 'pbmask'), 
-                gridder = 'standard', 
-                pbcor = True,
-                threshold=threshold,
-                interactive = False,
-                chanchunks=-1,
-                parallel=True)
+        tclean(**params)
 
-    # Put RMS
+    # Put RMS and export fits
     imagename = args.imagename[0] + '.image'
-    box = get_box(imagename)
-    put_rms(imagename, box=box)
-
-    # Export fits
-    exportfits(imagename=imagename, fitsimage=imagename + '.fits',
-            overwrite=True)
+    box = casa_rms.get_box(imagename)
+    if casa_rms.fits is None:
+        put_rms(imagename, box=box)
+        casa_rms.export_fits(imagename, imagename + '.fits')
+    else:
+        rms = casa_rms.export_fits(imagename, imagename + '.fits', box=box)
+        put_rms(imagename, box=box, rms=rms)
 
 if __name__=='__main__':
     main()
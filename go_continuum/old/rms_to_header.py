@@ -1,32 +1,47 @@
 #!casa -c
+from multiprocessing import Pool
 import argparse
+import os
+import sys
 
-def get_box(imagename, size=50):
-    # Get image size
-    imshape = imhead(imagename=imagename, mode='get', hdkey='shape')
+# Local utils
+aux = os.path.dirname(sys.argv[2])
+sys.path.insert(0, aux)
+import casa_rms
 
-    # Box
-    xtrc = imshape[0]/4
-    ytrc = imshape[0]/2
-    xblc = xtrc - size
-    ytrc = ytrc - size
-
-    return "%i,%i,%i,%i" % (xblc, ytrc, xtrc, ytrc)
-
-def put_rms(imagename, box=''):
+def put_rms(imagename, box='', rms=None):
     # Get rms
-    casalog.post('Compute rms for: ' + imagename)
-    stats = imstat(imagename=imagename, box=box, stokes='I')
-    if box=='':
-        rms = 1.482602219*stats['medabsdevmed'][0]
-    else:
-        rms = stats['rms'][0]
+    if rms is None:
+        casalog.post('Compute rms for: ' + imagename)
+        stats = imstat(imagename=imagename, box=box, stokes='I')
+        if box=='':
+            rms = 1.482602219*stats['medabsdevmed'][0]
+        else:
+            rms = stats['rms'][0]
 
     # Put in header
     imhead(imagename=imagename, mode='put', hdkey='rms',
             hdvalue=rms)
     casalog.post('Image rms: %f mJy/beam' % (rms*1E3,))
 
+def process_image(job):
+    """Store the rms and export a single image."""
+    imagename, use_box = job
+
+    # Box
+    if use_box:
+        box = casa_rms.get_box(imagename)
+    else:
+        box = '' 
+
+    # Put in header and convert to FITS
+    if casa_rms.fits is None:
+        put_rms(imagename, box=box)
+        casa_rms.export_fits(imagename, imagename+'.fits')
+    else:
+        rms = casa_rms.export_fits(imagename, imagename+'.fits', box=box)
+        put_rms(imagename, box=box, rms=rms)
+
 def main():
     # Command line options
     parser = argparse.ArgumentParser()
@@ -34,23 +49,23 @@ def main():
             help='Casa parameter')
     parser.add_argument('--use_box', action='store_true',
             help='Use the default box ')
+    parser.add_argument('--jobs', type=int, default=1,
+            help='Number of images processed in parallel')
     parser.add_argument('images', nargs='*', type=str,
             help='Image file names')
     args = parser.parse_args()
 
-    for imagename in args.images:
-        # Box
-        if args.use_box:
-            box = get_box(imagename)
-        else:
-            box = '' 
-
-        # Put in header
-        put_rms(imagename, box=box)
-
-        # Convert to FITS
-        exportfits(imagename=imagename, fitsimage=imagename+'.fits', 
-                overwrite=True)
+    jobs = [(imagename, args.use_box) for imagename in args.images]
+    if args.jobs > 1 and len(jobs) > 1:
+        pool = Pool(processes=min(args.jobs, len(jobs)))
+        try:
+            pool.map(process_image, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            process_image(job)
 
 if __name__=="__main__":
     main()
@@ -1,43 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from configparser import ConfigParser
 from pathlib import Path
 from typing import Sequence
 import argparse
+import json
+import os
 import sys
 
-from casatasks import tclean, exportfits
+from casatasks import tclean, vishead
 
 # Local utils
 #aux = os.path.dirname(sys.argv[2])
 #sys.path.insert(0, aux)
 import casa_logging
+import casa_rms
 import casa_utils as utils
 
-def run_tclean(log, **kwargs):
-    """Run `tclean` with the input parameters."""
+def _get_spw_names(vis: Path, outputdir: Path) -> list:
+    """Spectral window names of `vis`.
+
+    The names are stored in `outputdir` and reused while the spectral window
+    table of `vis` is unchanged (e.g. when rerunning with `--noredo`).
+    """
+    cache = outputdir / f'{vis.name}.spw_names.json'
+    mtime_ns = (vis / 'SPECTRAL_WINDOW' / 'table.dat').stat().st_mtime_ns
+    if cache.is_file():
+        cached = json.loads(cache.read_text())
+    else:
+        cached = {}
+    if cached.get('mtime_ns') == mtime_ns:
+        return cached['spw_names']
+
+    spw_names = [str(name) for name in
+                 vishead(vis=str(vis), mode='list')['spw_name'][0]]
+    cached = {'mtime_ns': mtime_ns, 'spw_names': spw_names}
+    cache.write_text(json.dumps(cached, indent=4))
+
+    return spw_names
+
+def run_tclean(log, export=True, **kwargs):
+    """Run `tclean` with the input parameters.
+
+    If `export` is `False`, the rms and FITS file are not computed (e.g. for
+    channel chunks that will be joined later).
+    """
     # Run tclean
     log.post(f"Image name: {kwargs['imagename']}")
     log.post(f"Processing spw: {kwargs['spw']}")
     tclean(**kwargs)
+    if not export:
+        return
 
     # Compute rms
     imagename = kwargs['imagename'].name + '.image'
     imagename = kwargs['imagename'].with_name(imagename)
+    export_image(imagename, log)
+
+def export_image(imagename, log):
+    """Store the rms in the header of `imagename` and export it to FITS."""
     utils.put_rms(imagename, log=log)
 
     # Export FITS
-    exportfits(imagename=imagename, 
-               fitsimage=imagename.with_suffix('.image.fits'), 
-               overwrite=True)
+    casa_rms.export_fits(imagename, imagename.with_suffix('.image.fits'))
+
+def channel_chunks(nchan: int, nchunks: int) -> list:
+    """Split `nchan` channels in `nchunks` contiguous `(start, nchan)`."""
+    size, extra = divmod(nchan, nchunks)
+    chunks = []
+    start = 0
+    for i in range(min(nchunks, nchan)):
+        width = size + (i < extra)
+        chunks.append((start, width))
+        start += width
+
+    return chunks
+
+def _get_nchan(vis: Path, spw: int) -> int:
+    """Number of channels of `spw` in `vis`."""
+    from casatools import msmetadata
+    msmd = msmetadata()
+    msmd.open(str(vis))
+    try:
+        return msmd.nchan(spw)
+    finally:
+        msmd.close()
+
+def _image_done(imagename: Path) -> bool:
+    """Whether the CASA image of `imagename` was already computed."""
+    image = imagename.with_name(f'{imagename.name}.image')
+    return (image / 'table.dat').exists()
+
+def _run_job(kwargs: dict) -> None:
+    """Run a `tclean` job in a worker process."""
+    from casatasks import casalog
+    run_tclean(casalog, **kwargs)
+
+def _export_job(imagename: Path) -> None:
+    """Store the rms and export an image in a worker process."""
+    from casatasks import casalog
+    export_image(imagename, casalog)
 
 def _run_tclean(args: argparse.NameSpace) -> None:
-    """Run `tclean` for all the uvdata in args."""
+    """Run `tclean` for all the uvdata in args.
+
+    The images are independent, so with the `pool` backend they are
+    computed in parallel worker processes.
+    """
     # Output directory
     outputdir = Path(args.outputdir[0])
+    outputdir.mkdir(parents=True, exist_ok=True)
 
     # Robust shortcut
     robust = args.tclean_params['robust']
 
+    # Options in the config section
+    section_opts = frozenset(args.config)
+
+    # Channel chunks are only defined for cubes over all the spw channels
+    nchunks = args.nchunks[0]
+    if nchunks > 1 and args.tclean_params.get('specmode') != 'cube':
+        args.log.post('Channel chunks only apply to cubes, ignoring --nchunks')
+        nchunks = 1
+    elif nchunks > 1:
+        fixed = [key for key in ('start', 'width', 'nchan')
+                 if key in args.tclean_params]
+        if fixed:
+            raise ValueError(('--nchunks cannot be used with tclean '
+                              f'{", ".join(fixed)} in the configuration'))
+
     # Iterate over visibilities
+    jobs = []
+    joins = []
     for ms in args.uvdata:
         # Check uvdata
         vis = Path(ms)
@@ -46,7 +140,7 @@ def _run_tclean(args: argparse.NameSpace) -> None:
             continue
 
         # Number of spws
-        nspws = len(vishead(vis=vis, mode='list')['spw_name'][0])
+        nspws = len(_get_spw_names(vis, outputdir))
         args.log.post(f'Processing ms: {vis}')
         args.log.post(f'Number of spws in ms {vis}: {nspws}')
 
@@ -60,24 +154,83 @@ def _run_tclean(args: argparse.NameSpace) -> None:
 
         # Cases:
         # Combine spws or compute just for specific spw
-        if args.all_spws or 'spw' in args.config or args.spw is not None:
+        if args.all_spws or 'spw' in section_opts or args.spw is not None:
             spw = ','.join(map(str, range(nspws)))
             if args.spw:
                 spw = args.spw[0]
                 imagename = outputdir / f'{msname}.spw{spw}.robust{robust}'
-            elif 'spw' in args.config and args.config['spw'] != spw:
+            elif 'spw' in section_opts and args.config['spw'] != spw:
                 spw = args.config['spw'].replace(',', '_')
                 imagename = outputdir / f'{msname}.spw{spw}.robust{robust}'
             else:
                 imagename = outputdir / f'{msname}.robust{robust}'
-            run_tclean(args.log, vis=vis, spw=spw, imagename=imagename,
-                       **args.tclean_params)
+            jobs.append(dict(vis=vis, spw=spw, imagename=imagename,
+                             **args.tclean_params))
         else:
             # All spectral windows one by one
             for spw in range(nspws):
                 imagename = outputdir / f'{msname}.spw{spw}.robust{robust}'
-                run_tclean(args.log, vis=ms, spw=f'{spw}', imagename=imagename,
-                           **args.tclean_params)
+                if nchunks <= 1:
+                    jobs.append(dict(vis=ms, spw=f'{spw}',
+                                     imagename=imagename,
+                                     **args.tclean_params))
+                    continue
+
+                # Image channel chunks independently
+                chunks = channel_chunks(_get_nchan(vis, spw), nchunks)
+                chunknames = []
+                for i, (start, nchan) in enumerate(chunks):
+                    chunkname = imagename.with_name(
+                        f'{imagename.name}.chunk{i:02d}')
+                    chunknames.append(chunkname.with_name(
+                        f'{chunkname.name}.image'))
+                    jobs.append(args.tclean_params |
+                                dict(vis=ms, spw=f'{spw}',
+                                     imagename=chunkname, start=start,
+                                     nchan=nchan, export=False))
+                channels = [f'0~{nchan - 1}' for _, nchan in chunks]
+                joins.append((chunknames,
+                              imagename.with_name(f'{imagename.name}.image'),
+                              channels))
+
+    # Skip finished images
+    if args.noredo:
+        for job in jobs:
+            if _image_done(job['imagename']):
+                args.log.post(f"Skipping image: {job['imagename']}")
+        jobs = [job for job in jobs if not _image_done(job['imagename'])]
+        joins = [join for join in joins
+                 if not (join[1] / 'table.dat').exists()]
+
+    # Run jobs
+    if args.backend[0] == 'pool' and len(jobs) > 1:
+        args.log.post(f'Running {len(jobs)} tclean jobs in parallel')
+        with ProcessPoolExecutor(max_workers=args.njobs[0],
+                                 mp_context=get_context('spawn')) as pool:
+            list(pool.map(_run_job, jobs))
+    else:
+        # Export each image in a separate process while the next one is
+        # computed. Spawned processes do not inherit the CASA state.
+        with ProcessPoolExecutor(max_workers=1,
+                                 mp_context=get_context('spawn')) as exporter:
+            exports = []
+            for job in jobs:
+                job = dict(job)
+                export = job.pop('export', True)
+                run_tclean(args.log, export=False, **job)
+                if export:
+                    imagename = job['imagename']
+                    imagename = imagename.with_name(f'{imagename.name}.image')
+                    exports.append(exporter.submit(_export_job, imagename))
+            for export in exports:
+                export.result()
+
+    # Join channel chunks
+    for chunknames, imagename, channels in joins:
+        args.log.post(f'Joining {len(chunknames)} chunks into: {imagename}')
+        utils.join_cubes([str(chunk) for chunk in chunknames], str(imagename),
+                         channels, box=None)
+        export_image(imagename, args.log)
 
 def main(inpargs: Sequence[str]):
     """Run tclean from command line.
@@ -107,6 +260,15 @@ def main(inpargs: Sequence[str]):
                        help='Value for tclean spw')
     parser.add_argument('--section', nargs=1, type=str, default=['dirty'],
                         help='Configuration section name')
+    parser.add_argument('--backend', nargs=1, type=str, default=['serial'],
+                        choices=['serial', 'pool'],
+                        help='Run the tclean jobs serially or in a pool')
+    parser.add_argument('--njobs', nargs=1, type=int, default=[None],
+                        help='Number of processes for the pool backend')
+    parser.add_argument('--noredo', action='store_true',
+                        help='Do not redo if files exists')
+    parser.add_argument('--nchunks', nargs=1, type=int, default=[1],
+                        help='Number of channel chunks imaged per spw')
     parser.add_argument('configfile', nargs=1, type=str,
                         help='Configuration file name')
     parser.add_argument('outputdir', nargs=1, type=str,
@@ -1,4 +1,5 @@
 #!casa -c
+from multiprocessing.pool import ThreadPool
 import argparse
 import os
 from ConfigParser import ConfigParser
@@ -21,6 +22,37 @@ methods are available:
     values.
 """
 
+def read_chans(chfile):
+    if not os.path.isfile(chfile):
+        return None
+    with open(chfile) as f:
+        return f.readline().strip()
+
+def check_noredo(args):
+    args.skip_load = (args.noredo and
+            os.path.isdir(args.uvdata[0]+'.contsub'))
+
+def load_chan_list(args):
+    """Build the uvcontsub `fitspw` from the channel list files.
+
+    The files are read concurrently, one per spectral window in order, and
+    the spectral windows with an empty channel list are skipped. The files
+    are not read if uvcontsub will be skipped.
+    """
+    if args.skip_load:
+        return
+    pool = ThreadPool(min(len(args.chans), 32) or 1)
+    try:
+        lines = pool.map(read_chans, args.chans)
+    finally:
+        pool.close()
+    missing = [chfile for chfile, ln in zip(args.chans, lines) if ln is None]
+    if missing:
+        raise IOError('Channel files do not exist: %s' % ', '.join(missing))
+    # Spws without lines have empty channel lists
+    args.fitspw = ','.join('%i:%s' % (i, ln) for i, ln in enumerate(lines)
+            if ln)
+
 def run_uvcontsub(args):
     args.outvis = args.uvdata[0]+'.contsub'
     if args.noredo and os.path.isdir(args.outvis):
@@ -50,10 +82,10 @@ def main():
             help='uv data ms')
     parser.add_argument('chans', nargs='*', action=utils.NormalizePath, 
             help='Channel list files')
-    parser.set_defaults(pipe=[utils.verify_args, utils.load_config,
-        utils.load_chan_list, run_uvcontsub, utils._run_cal],
+    parser.set_defaults(pipe=[check_noredo, utils.verify_args,
+        utils.load_config, load_chan_list, run_uvcontsub, utils._run_cal],
             config=config_default, calsect='lineapplycal', outvis=None,
-            fitspw=None)
+            fitspw=None, skip_load=False)
     args = parser.parse_args()
 
     # Run steps in pipe
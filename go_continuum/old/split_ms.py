@@ -1,5 +1,8 @@
+from multiprocessing import Process
+from multiprocessing.pool import ThreadPool
 import argparse
 import os
+import shutil
 from ConfigParser import ConfigParser
 
 # Local utils
@@ -7,64 +10,143 @@ aux = os.path.dirname(sys.argv[2])
 sys.path.insert(0, aux)
 import casa_utils as utils
 
+def parse_int_list(value, sep=None):
+    """Convert a `sep` separated string to a list of integers."""
+    return [int(x) for x in value.split(sep) if x]
+
+def read_chans(chfile):
+    if not os.path.isfile(chfile):
+        return None
+    with open(chfile) as f:
+        return f.readline().strip()
+
+def load_chan_list(args):
+    """Build the `fitspw` from the channel list files.
+
+    The files are read concurrently, one per spectral window in order. The
+    spectral windows with an empty channel list are skipped.
+    """
+    pool = ThreadPool(min(len(args.chans), 32) or 1)
+    try:
+        lines = pool.map(read_chans, args.chans)
+    finally:
+        pool.close()
+    missing = [chfile for chfile, ln in zip(args.chans, lines) if ln is None]
+    if missing:
+        raise IOError('Channel files do not exist: %s' % ', '.join(missing))
+    # Spws without lines have empty channel lists
+    args.fitspw = ','.join('%i:%s' % (i, ln) for i, ln in enumerate(lines)
+            if ln)
+
+def has_column(vis, column):
+    tb.open(vis)
+    try:
+        return column in tb.colnames()
+    finally:
+        tb.close()
+
+def preflight(args, outputs):
+    """Check the inputs before the ms is modified."""
+    for outputvis in outputs:
+        outdir = os.path.dirname(os.path.abspath(outputvis))
+        if not os.access(outdir, os.W_OK):
+            msg = 'Cannot write to output directory: %s' % outdir
+            casalog.post(msg, 'SEVERE')
+            raise IOError(msg)
+
+def average_split(vis, outputvis, spw, width, datacolumn, numsubms=None):
+    """Split and channel average `vis` in a single mstransform pass.
+
+    If `numsubms` is given, a Multi-MS separated by spw is created so the
+    spws are processed in parallel (when running under `mpicasa`).
+    """
+    if os.path.isdir(outputvis):
+        casalog.post('Deleting %s' % outputvis, 'WARN')
+        shutil.rmtree(outputvis, ignore_errors=True)
+    if numsubms is not None:
+        mms = {'createmms': True, 'separationaxis': 'spw',
+                'numsubms': numsubms}
+    else:
+        mms = {}
+    mstransform(vis=vis, outputvis=outputvis, spw=spw,
+            datacolumn=datacolumn, chanaverage=True, chanbin=width,
+            usewtspectrum=True, reindex=True, **mms)
+
 def split_ms(args):
     # Convenience variables
     config = args.config
     section = args.section[0]
+    cfg = dict(config.items(section))
+    spws = cfg['spws']
+    datacolumn = cfg['datacolumn']
+    out_cont = args.uvdata[0] + '.cont_avg'
+    out_all = args.uvdata[0] + '.allchannels_avg'
     
     # Define width and validate
-    lenspw = len(config.get(section,'spws').split(','))
+    lenspw = len(spws.split(','))
     if args.widths_avg is not None:
-        width = map(int, args.widths_avg.split(','))
-    elif 'width' in config.options(section):
-        width = map(int, config.get(section,'width').split())
-        if len(width) != lenspw and args.eb[0] is not None:
-            widths = config.get(section,'width').split(',')
-            widths = widths[args.eb[0]-1].split()
-            width = map(int, widths)
+        width = parse_int_list(args.widths_avg, sep=',')
+    elif 'width' in cfg:
+        cfgwidth = cfg['width']
+        if ',' in cfgwidth and args.eb[0] is not None:
+            widths = cfgwidth.split(',')
+            width = parse_int_list(widths[args.eb[0]-1])
             casalog.post('Multiple widths detected, using: %r' % (width,))
+        else:
+            width = parse_int_list(cfgwidth.replace(',', ' '))
     else:
         casalog.post('width parameter is not defined', 'SEVERE')
         raise ValueError('width parameter is not defined')
     if len(width) != lenspw:
         if len(width)==1:
             casalog.post('Using the same width for all spws', 'WARN')
-            width = width*lenspws
+            width = width*lenspw
         else:
             msg = 'The number of spws does not match the number of widths'
             casalog.post(msg, 'SEVERE')
             raise ValueError(msg)
     
+    # Validate before modifying the ms
+    preflight(args, (out_cont, out_all))
+
     # Split flagged
     flagmanager(vis=args.uvdata[0], mode='save', versionname='before_cont_flags')
-    initweights(vis=args.uvdata[0], wtmode='weight', dowtsp=True)
-    flagdata(vis=args.uvdata[0], mode='manual', spw=args.fitspw, flagbackup=False)
-    outputvis = args.uvdata[0]+'.cont_avg'
+    if args.reinit_weights or not has_column(args.uvdata[0],
+            'WEIGHT_SPECTRUM'):
+        initweights(vis=args.uvdata[0], wtmode='weight', dowtsp=True)
+    else:
+        casalog.post('WEIGHT_SPECTRUM already exists, skipping initweights')
+    if args.fitspw:
+        flagdata(vis=args.uvdata[0], mode='manual', spw=args.fitspw,
+                flagbackup=False)
+    else:
+        casalog.post('No line channels to flag')
+    outputvis = out_cont
     args.outvis = outputvis
-    if os.path.isdir(outputvis):
-        casalog.post('Deleting %s' % outputvis, 'WARN')
-        os.system('rm -rf %s' % outputvis)
-    split(vis=args.uvdata[0],
-            spw=config.get(section,'spws'),
-            outputvis=outputvis,
-            width=width,
-            datacolumn=config.get(section,'datacolumn'))
+    average_split(args.uvdata[0], outputvis, spws, width, datacolumn,
+            numsubms=args.numsubms)
     flagmanager(vis=args.uvdata[0], mode='restore', versionname='before_cont_flags')
-    utils._run_cal(args)
+
+    # Calibrate the flagged split while the unflagged split is computed
+    if args.serial:
+        utils._run_cal(args)
+    else:
+        cal = Process(target=utils._run_cal, args=(args,))
+        cal.start()
     
     # Split unflagged
-    outputvis = args.uvdata[0]+'.allchannels_avg'
+    outputvis = out_all
     args.outvis = outputvis
-    if os.path.isdir(outputvis):
-        casalog.post('Deleting %s' % outputvis, 'WARN')
-        os.system('rm -rf %s' % outputvis)
-    split(vis=args.uvdata[0],
-            spw=config.get(section,'spws'),
-            outputvis=outputvis, 
-            width=width,
-            datacolumn=config.get(section,'datacolumn'))
+    average_split(args.uvdata[0], outputvis, spws, width, datacolumn,
+            numsubms=args.numsubms)
     utils._run_cal(args)
 
+    # Both calibrations run on different ms, wait for the first one last
+    if not args.serial:
+        cal.join()
+        if cal.exitcode != 0:
+            raise RuntimeError('Calibration of %s failed' % out_cont)
+
 def main():
     # Configuration file default values
     config_default = {'spws':'0,1,2,3', 'datacolumn':'corrected', 
@@ -81,6 +163,12 @@ def main():
             help='Section in config file')
     parser.add_argument('--eb', nargs=1, type=int, default=[None],
             help='EB number')
+    parser.add_argument('--reinit_weights', action='store_true',
+            help='Run initweights even if WEIGHT_SPECTRUM exists')
+    parser.add_argument('--serial', action='store_true',
+            help='Do not overlap the calibration and split steps')
+    parser.add_argument('--numsubms', default=None, type=int,
+            help='Number of sub-MSs for a Multi-MS output split by spw')
     parser.add_argument('--widths_avg', default=None, type=str,
             help='Channel width average (coma separated)')
     parser.add_argument('configfile', nargs=1, action=utils.NormalizePath,
@@ -90,7 +178,7 @@ def main():
     parser.add_argument('chans', nargs='*', action=utils.NormalizePath,
             help='Channel list files')
     parser.set_defaults(pipe=[utils.verify_args, utils.load_config,
-        utils.load_chan_list, split_ms],
+        load_chan_list, split_ms],
             config=config_default, calsect='contapplycal', outvis=None,
             fitspw=None)
     args = parser.parse_args()
@@ -1,6 +1,8 @@
+import atexit
 import os
 import logging
 import logging.handlers
+import queue
 
 def get_logger(name, file_name='debug.log', **kwargs):
     """Creates a new logger.
@@ -17,6 +19,10 @@ def get_logger(name, file_name='debug.log', **kwargs):
             logging to std output message format.
         maxBytes (int, default=5MB): maximum size of logging file in bytes.
         backupCount (int, default=5): maximum number of log files to rotate.
+
+    The records are emitted from a background thread through a
+    `QueueListener`, stored in the `listener` attribute of the logger and
+    stopped at exit.
     """
     # Create logger
     logger = logging.getLogger(name)
@@ -42,8 +48,12 @@ def get_logger(name, file_name='debug.log', **kwargs):
             '%(levelname)s: %(message)s')))
 
         # Register handlers
-        logger.addHandler(fh)
-        logger.addHandler(sh)
+        q = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(q))
+        logger.listener = logging.handlers.QueueListener(q, fh, sh,
+                respect_handler_level=True)
+        logger.listener.start()
+        atexit.register(logger.listener.stop)
 
     return logger
 